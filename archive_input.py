@@ -0,0 +1,87 @@
+import cv2
+import glob
+import numpy as np
+import os
+import tarfile
+import zipfile
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+from intermediates import IMAGE_EXTENSIONS, natural_key
+
+
+def is_image_name(name: str) -> bool:
+    """Проверяет расширение файла изображения"""
+    return name.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def decode_image(data: bytes) -> Optional[np.ndarray]:
+    """Декодирует изображение из байтов (BGR, как cv2.imread)"""
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+def expand_inputs(inputs: Union[str, Iterable[str]]) -> List[str]:
+    """Раскрывает входы: папки, файлы, архивы и маски вида sessions/*.zip (FileNotFoundError, если входа нет)"""
+    if isinstance(inputs, str):
+        inputs = [inputs]
+    paths = []
+    for item in inputs:
+        if glob.has_magic(item):
+            matches = sorted(glob.glob(item), key=natural_key)
+            if not matches:
+                raise FileNotFoundError(f"Маска {item} не нашла ни одного файла")
+            paths.extend(matches)
+        elif os.path.exists(item):
+            paths.append(item)
+        else:
+            raise FileNotFoundError(f"Вход {item} не найден")
+    return paths
+
+
+def _iter_zip(path: str) -> Iterator[Tuple[str, np.ndarray]]:
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            if info.is_dir() or not is_image_name(info.filename):
+                continue
+            image = decode_image(archive.read(info))
+            if image is not None:
+                yield f'{os.path.basename(path)}/{info.filename}', image
+
+
+def _iter_tar(path: str) -> Iterator[Tuple[str, np.ndarray]]:
+    # Потоковый режим: сжатый tar читается за один проход, без перемотки назад
+    with tarfile.open(path, 'r|*') as archive:
+        for member in archive:
+            if not member.isfile() or not is_image_name(member.name):
+                continue
+            data = archive.extractfile(member)
+            if data is None:
+                continue
+            image = decode_image(data.read())
+            if image is not None:
+                yield f'{os.path.basename(path)}/{member.name}', image
+
+
+def iter_input_images(inputs: Union[str, Iterable[str]]) -> Iterator[Tuple[str, np.ndarray]]:
+    """Перебирает скриншоты из папок, файлов и zip/tar архивов без распаковки на диск.
+
+    Порядок детерминирован: входы — как переданы (маски — по именам),
+    файлы папок — по именам в естественном порядке, члены любых архивов
+    (zip, tar, tar.gz и т.д.) — в порядке записи в архив: так архив читается
+    за один проход, а сжатый tar не приходится распаковывать повторно.
+    Имя изображения из архива — «архив/путь внутри архива».
+    Отсутствующий вход или пустая маска — FileNotFoundError.
+    """
+    for path in expand_inputs(inputs):
+        if os.path.isdir(path):
+            for filename in sorted(os.listdir(path), key=natural_key):
+                if is_image_name(filename):
+                    image = cv2.imread(os.path.join(path, filename))
+                    if image is not None:
+                        yield filename, image
+        elif is_image_name(path):
+            image = cv2.imread(path)
+            if image is not None:
+                yield os.path.basename(path), image
+        elif zipfile.is_zipfile(path):
+            yield from _iter_zip(path)
+        elif tarfile.is_tarfile(path):
+            yield from _iter_tar(path)
@@ -0,0 +1,156 @@
+import cv2
+import numpy as np
+import os
+from typing import List, Optional, Tuple
+from layout import FIELD_RATIOS
+from intermediates import iter_labelled_cards
+
+# Таблица числа единичных битов для каждого байта
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+# Сторона цветной миниатюры иконки
+COLOR_SIZE = 16
+
+
+class ArtworkIndex:
+    """Определяет предмет по изображению на карточке.
+
+    Для области иконки считается перцептивный хеш (pHash, 64 бита) —
+    форма предмета — и цветная миниатюра в Lab — окраска скина. Название
+    ищется как ближайший сосед по расстоянию Хэмминга среди размеченных
+    карточек того же цвета.
+    """
+
+    def __init__(self, index_file: str = 'json/artwork_index.npz', max_distance: int = 8, min_margin: int = 4,
+                 max_color_distance: float = 16.0):
+        self.index_file = index_file
+        self.max_distance = max_distance
+        self.min_margin = min_margin
+        self.max_color_distance = max_color_distance
+        self.names: List[str] = []
+        self.hashes = np.empty((0, 8), dtype=np.uint8)
+        self.colors = np.empty((0, COLOR_SIZE * COLOR_SIZE * 3), dtype=np.uint8)
+        self.load_index()
+
+    @property
+    def is_ready(self) -> bool:
+        """Есть ли записи в индексе"""
+        return len(self.names) > 0
+
+    def load_index(self) -> None:
+        """Загружает индекс из файла, если он существует"""
+        if not os.path.exists(self.index_file):
+            return
+        data = np.load(self.index_file)
+        if 'colors' not in data:
+            # Индекс без цвета путал бы скины одной формы — его нужно перестроить
+            print(f"Индекс {self.index_file} без цветовых признаков, перестройте его (python artwork_index.py)")
+            return
+        self.names = [str(name) for name in data['names']]
+        self.hashes = data['hashes']
+        self.colors = data['colors']
+
+    def save_index(self) -> None:
+        """Сохраняет индекс в файл"""
+        folder = os.path.dirname(self.index_file)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        np.savez(self.index_file, names=np.array(self.names), hashes=self.hashes, colors=self.colors)
+
+    @staticmethod
+    def icon_region(card: np.ndarray) -> np.ndarray:
+        """Возвращает область иконки — часть карточки над текстом"""
+        hi = card.shape[0]
+        return card[:hi - int(hi * FIELD_RATIOS['text']), :]
+
+    @staticmethod
+    def compute_hash(icon: np.ndarray) -> np.ndarray:
+        """Считает pHash изображения: 64 бита, упакованные в 8 байт"""
+        gray = cv2.cvtColor(icon, cv2.COLOR_BGR2GRAY) if icon.ndim == 3 else icon
+        small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+        low = cv2.dct(small)[:8, :8].ravel()
+        # Постоянная составляющая не несёт информации о форме
+        bits = low > np.median(low[1:])
+        return np.packbits(bits)
+
+    @staticmethod
+    def compute_colors(icon: np.ndarray) -> np.ndarray:
+        """Цветная миниатюра иконки в Lab (COLOR_SIZE x COLOR_SIZE x 3 байт)"""
+        if icon.ndim == 2:
+            icon = cv2.cvtColor(icon, cv2.COLOR_GRAY2BGR)
+        small = cv2.resize(icon, (COLOR_SIZE, COLOR_SIZE), interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2LAB).ravel()
+
+    def add(self, card: np.ndarray, name: str) -> None:
+        """Добавляет карточку в индекс, пропуская уже известные записи с тем же именем"""
+        icon = self.icon_region(card)
+        card_hash = self.compute_hash(icon)
+        card_colors = self.compute_colors(icon)
+        if self.is_ready:
+            same = ((self.distances(card_hash) == 0) & (self.color_distances(card_colors) <= self.max_color_distance / 2)
+                    & (np.array(self.names) == name))
+            if same.any():
+                return
+        self.names.append(name)
+        self.hashes = np.vstack([self.hashes, card_hash[None, :]])
+        self.colors = np.vstack([self.colors, card_colors[None, :]])
+
+    def distances(self, card_hash: np.ndarray) -> np.ndarray:
+        """Расстояния Хэмминга от хеша до всех записей индекса"""
+        return _POPCOUNT[np.bitwise_xor(self.hashes, card_hash)].sum(axis=1)
+
+    def color_distances(self, card_colors: np.ndarray) -> np.ndarray:
+        """Цветовые расстояния до всех записей индекса: средняя разница Lab в 10% самых непохожих клеток.
+
+        По худшим клеткам, а не по среднему, чтобы различался узор (камуфляж
+        того же цвета); общий сдвиг яркости не учитывается.
+        """
+        difference = self.colors.reshape(len(self.colors), -1, 3).astype(np.float32) - \
+            card_colors.reshape(1, -1, 3).astype(np.float32)
+        difference[:, :, 0] -= difference[:, :, 0].mean(axis=1, keepdims=True)
+        cells = np.sort(np.linalg.norm(difference, axis=2), axis=1)
+        worst = max(1, cells.shape[1] // 10)
+        return cells[:, -worst:].mean(axis=1)
+
+    def lookup(self, card: np.ndarray) -> Tuple[Optional[str], int]:
+        """Ищет название предмета по карточке.
+
+        Возвращает (название, расстояние). Название равно None, если нет
+        записи близкой и по форме, и по цвету (например, скин не
+        проиндексирован), или совпадение неоднозначное (запись того же
+        цвета с другим именем почти так же близка) — тогда нужен OCR названия.
+        """
+        if not self.is_ready:
+            return None, -1
+        icon = self.icon_region(card)
+        distances = self.distances(self.compute_hash(icon))
+        # Форма совпадает и у разных скинов одного оружия — учитываются только записи того же цвета
+        same_color = self.color_distances(self.compute_colors(icon)) <= self.max_color_distance
+        if not same_color.any():
+            return None, int(distances.min())
+        candidates = np.where(same_color, distances, np.iinfo(np.int32).max)
+        best = int(np.argmin(candidates))
+        best_distance = int(distances[best])
+        if best_distance > self.max_distance:
+            return None, best_distance
+
+        others = distances[same_color & (np.array(self.names) != self.names[best])]
+        if len(others) and int(others.min()) - best_distance < self.min_margin:
+            return None, best_distance
+        return self.names[best], best_distance
+
+
+def main():
+    index = ArtworkIndex()
+    added = 0
+    for card, image in iter_labelled_cards('all_card_data.json', 'ready_screenshots'):
+        if not card.get('Name'):
+            continue
+        index.add(image, card['Name'])
+        added += 1
+
+    index.save_index()
+    print(f"В индекс добавлено {added} карточек, записей: {len(index.names)}")
+
+if __name__ == "__main__":
+    main()
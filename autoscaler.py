@@ -0,0 +1,146 @@
+import os
+import time
+from typing import Optional, Tuple
+
+
+def process_rss_mb(pid: int) -> float:
+    """Резидентная память процесса в МБ (по /proc, 0 если недоступно)"""
+    try:
+        with open(f'/proc/{pid}/status', 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return 0.0
+
+
+def cpu_load() -> float:
+    """Загрузка CPU как доля от числа ядер (средняя за минуту)"""
+    try:
+        return os.getloadavg()[0] / (os.cpu_count() or 1)
+    except (OSError, AttributeError):
+        return 0.0
+
+
+def cpu_times() -> Optional[Tuple[float, float]]:
+    """Суммарное занятое и общее время всех ядер по /proc/stat (None, если недоступно)"""
+    try:
+        with open('/proc/stat', 'r', encoding='utf-8') as f:
+            fields = [float(value) for value in f.readline().split()[1:]]
+    except (OSError, ValueError):
+        return None
+    if len(fields) < 4:
+        return None
+    # idle и iowait — простой
+    idle = fields[3] + (fields[4] if len(fields) > 4 else 0.0)
+    total = sum(fields[:8])
+    return total - idle, total
+
+
+class WorkerAutoscaler:
+    """Подбирает число воркеров OCR и размер пачки под бюджет памяти, загрузку CPU и задержку пачки"""
+
+    def __init__(self, rss_budget_mb: float, min_workers: int = 1, max_workers: Optional[int] = None,
+                 initial_worker_mb: float = 800.0, max_cpu_load: float = 0.9, target_latency: float = 2.0,
+                 max_batch_size: int = 32, cooldown: float = 5.0, check_interval: float = 1.0,
+                 worker_threads: int = 1):
+        self.rss_budget_mb = rss_budget_mb
+        self.min_workers = min_workers
+        self.max_workers = max_workers or os.cpu_count() or 1
+        # До первой обработанной пачки модель не загружена, размер воркера — initial_worker_mb
+        self.initial_worker_mb = initial_worker_mb
+        self.measured_worker_mb = 0.0
+        self.measured = False
+        # Доля всех ядер, которую можно занять; воркер занимает worker_threads ядер (см. torch.set_num_threads)
+        self.max_cpu_load = max_cpu_load
+        self.worker_threads = worker_threads
+        self.target_latency = target_latency
+        self.max_batch_size = max_batch_size
+        self.cooldown = cooldown
+        # Окно измерения загрузки CPU и очереди не короче check_interval
+        self.check_interval = check_interval
+        self.last_check = 0.0
+        self.pipeline = None
+        self.last_change = 0.0
+        self.last_cpu: Optional[Tuple[float, float]] = None
+        self.last_acquire_waits = 0
+
+    def attach(self, pipeline) -> None:
+        """Привязывает автоскейлер к запущенному SharedCardPipeline"""
+        self.pipeline = pipeline
+        self.last_change = self.last_check = time.monotonic()
+        self.last_cpu = cpu_times()
+        self.last_acquire_waits = pipeline.acquire_waits
+
+    def cpu_usage(self) -> float:
+        """Доля занятого времени всех ядер с прошлого вызова (без /proc/stat — средняя загрузка за минуту)"""
+        current = cpu_times()
+        previous, self.last_cpu = self.last_cpu, current
+        if current is None or previous is None or current[1] <= previous[1]:
+            return cpu_load()
+        return (current[0] - previous[0]) / (current[1] - previous[1])
+
+    def max_batch_for_slots(self) -> int:
+        """Наибольшая пачка, при которой слотов хватает на очереди всех воркеров (иначе часть простаивает)"""
+        per_worker = self.pipeline.slots // max(1, self.pipeline.active_workers * self.pipeline.prefetch)
+        return max(1, min(self.max_batch_size, per_worker))
+
+    @property
+    def worker_mb(self) -> float:
+        """Оценка памяти одного воркера"""
+        return self.measured_worker_mb if self.measured else self.initial_worker_mb
+
+    def memory_usage_mb(self) -> float:
+        """Суммарная память главного процесса и воркеров; обновляет оценку размера воркера"""
+        worker_rss = [process_rss_mb(pid) for pid in self.pipeline.worker_pids()]
+        if worker_rss and self.measured:
+            self.measured_worker_mb = max(self.measured_worker_mb, max(worker_rss))
+        # Воркер, ещё загружающий torch/EasyOCR, занимает десятки МБ, но скоро займёт полный размер
+        worker_mb = self.worker_mb
+        return process_rss_mb(os.getpid()) + sum(max(rss, worker_mb) for rss in worker_rss)
+
+    def record_batch(self, size: int, duration: float) -> None:
+        """Подстраивает размер пачки по времени её обработки"""
+        if self.pipeline is None:
+            return
+        if not self.measured:
+            # Пачка обработана, значит модель в воркере загружена — дальше размер измеряем
+            self.measured = True
+            self.memory_usage_mb()
+        limit = self.max_batch_for_slots()
+        if duration > self.target_latency and self.pipeline.batch_size > 1:
+            self.pipeline.batch_size = max(1, self.pipeline.batch_size // 2)
+        elif duration < self.target_latency / 2 and size >= self.pipeline.batch_size:
+            self.pipeline.batch_size = min(limit, self.pipeline.batch_size + 1)
+        self.pipeline.batch_size = min(self.pipeline.batch_size, limit)
+
+    def tick(self) -> None:
+        """Решает, добавить или убрать воркер (не чаще раза в cooldown секунд)"""
+        now = time.monotonic()
+        if self.pipeline is None or now - self.last_change < self.cooldown or now - self.last_check < self.check_interval:
+            return
+        self.last_check = now
+
+        # Очередь в карточках: ждёт хотя бы пачка или производитель упирался в занятые слоты
+        workers = self.pipeline.active_workers
+        blocked = self.pipeline.acquire_waits > self.last_acquire_waits
+        self.last_acquire_waits = self.pipeline.acquire_waits
+        backlog = blocked or self.pipeline.waiting_cards >= self.pipeline.batch_size
+        idle = not backlog and self.pipeline.idle_workers > 0
+        memory = self.memory_usage_mb()
+        load = self.cpu_usage()
+        # Загрузка за окно с прошлой проверки включает наших воркеров: новый должен поместиться в свободные ядра
+        one_worker_load = self.worker_threads / (os.cpu_count() or 1)
+
+        overloaded = memory > self.rss_budget_mb or load > self.max_cpu_load
+        if workers > self.min_workers and (overloaded or idle):
+            self.pipeline.stop_worker()
+        elif (workers < self.max_workers and backlog and load + one_worker_load <= self.max_cpu_load
+              and memory + self.worker_mb <= self.rss_budget_mb):
+            self.pipeline.start_worker()
+            # Слотов на воркер стало меньше — пачка не должна оставить новых воркеров без работы
+            self.pipeline.batch_size = min(self.pipeline.batch_size, self.max_batch_for_slots())
+        else:
+            return
+        self.last_change = time.monotonic()
@@ -0,0 +1,107 @@
+import json
+import os
+import sys
+import time
+from card_parser import CardFieldParser
+from intermediates import iter_intermediates
+
+SAMPLES_FILE = 'json/readtext_samples.json'
+
+
+def load_labels(labels_json):
+    """Размеченные карточки по имени изображения (при повторах — последняя запись)"""
+    if not os.path.exists(labels_json):
+        return {}
+    with open(labels_json, 'r', encoding='utf-8') as f:
+        return {card['image_name']: card for card in json.load(f) if 'image_name' in card}
+
+
+def record(folders, labels_json='all_card_data.json', samples_file=SAMPLES_FILE):
+    """Сохраняет результаты readtext карточек из папок (нужен EasyOCR)"""
+    from test2 import OCR_ENABLED, CardDetector
+    if not OCR_ENABLED:
+        print("EasyOCR не установлен: записать результаты readtext нельзя")
+        return
+
+    detector = CardDetector(load_existing=False)
+    labels = load_labels(labels_json)
+    samples = []
+    for folder in folders:
+        for image_name, image in iter_intermediates(folder):
+            results = detector.recognize_card_results(image, image_name)
+            samples.append({
+                'image_name': image_name,
+                'shape': list(image.shape),
+                'is_stattrack': bool(detector.is_stattrack),
+                'results': [[[[float(x), float(y)] for x, y in box], text, float(conf)] for box, text, conf in results],
+                'label': labels.get(image_name),
+            })
+            print(f"{image_name}: {len(results)} строк")
+
+    os.makedirs(os.path.dirname(samples_file), exist_ok=True)
+    with open(samples_file, 'w', encoding='utf-8') as f:
+        json.dump(samples, f, ensure_ascii=False, indent=4)
+    print(f"Сохранено {len(samples)} карточек в {samples_file}")
+
+
+def agreement(parsed, samples):
+    """Доля карточек с разметкой, у которых совпали все три поля"""
+    labelled = [(card, sample['label']) for (card, _), sample in zip(parsed, samples) if sample['label']]
+    same = sum(card['Name'] == label['Name'] and card['Count(WT)'] == label['Count(WT)']
+               and card['Price'] == label['Price'] for card, label in labelled)
+    return same, len(labelled)
+
+
+def main(samples_file=SAMPLES_FILE, min_parses=20000):
+    """Сравнивает test2.parse_card_text и CardFieldParser на записанных результатах readtext"""
+    if not os.path.exists(samples_file):
+        print(f"Нет {samples_file}. Запишите результаты OCR: python bench_card_parser.py record ready_screenshots simple")
+        return
+    with open(samples_file, 'r', encoding='utf-8') as f:
+        samples = json.load(f)
+    if not samples:
+        print("Нет записанных карточек")
+        return
+
+    from test2 import CardDetector, parse_card_text
+    from card_parser import classify_line
+    parser = CardFieldParser()
+    repeat = max(1, min_parses // len(samples))
+
+    def old_parse(sample, correct_names=()):
+        return parse_card_text("\n".join(text for _, text, _ in sample['results']), sample['is_stattrack'], correct_names)
+
+    def new_parse(sample):
+        return parser.parse(sample['results'], sample['shape'], sample['is_stattrack'])
+
+    # Скорость — без коррекции имён: она одинакова для обоих парсеров и занимает большую часть времени.
+    # Кэш classify_line сбрасывается перед каждым проходом: иначе повторные проходы меряют только попадания в кэш
+    for title, parse in (("parse_card_text", old_parse), ("CardFieldParser", new_parse)):
+        elapsed = 0.0
+        for _ in range(repeat):
+            classify_line.cache_clear()
+            start = time.perf_counter()
+            parsed = [parse(sample) for sample in samples]
+            elapsed += time.perf_counter() - start
+        complete = sum(is_complete for _, is_complete in parsed)
+        print(f"{title}: {elapsed * 1e6 / (repeat * len(samples)):.1f} мкс/карточку, "
+              f"полных {complete}/{len(samples)}")
+
+    fast = sum(parser.fields_by_rules([(text,) + parser.classify(text) for _, text, _ in sample['results']]) is not None
+               for sample in samples)
+    print(f"Быстрый путь CardFieldParser: {fast}/{len(samples)} карточек")
+
+    # Совпадение с разметкой — с коррекцией имён, как в CardDetector
+    detector = CardDetector(load_existing=False)
+    parser = detector.field_parser
+    for title, parse in (("parse_card_text", lambda sample: old_parse(sample, detector.correct_names)),
+                         ("CardFieldParser", new_parse)):
+        same, labelled = agreement([parse(sample) for sample in samples], samples)
+        print(f"{title}: совпало с разметкой {same}/{labelled}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == 'record':
+        record(sys.argv[2:] or ['ready_screenshots'])
+    else:
+        main()
@@ -0,0 +1,169 @@
+import re
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from layout import FIELD_RATIOS
+
+# Один результат EasyOCR: (четыре точки рамки, текст, уверенность)
+OCRResult = Tuple[Sequence[Sequence[float]], str, float]
+
+# Правила классификации строк: (тип, скомпилированное выражение).
+# Проверяются по порядку, строка получает тип первого совпавшего правила.
+LINE_RULES = [
+    ('count', re.compile(r'^\s*(\d+)\s*[wW][tT][.:;]?\s*$')),     # "701 wt"
+    ('wt', re.compile(r'^\s*[wW][tT][.:;]?\s*$')),                # отдельный маркер "wt"
+    ('price', re.compile(r'^\s*(?:G|6\s)\s*([\dOos]+(?:[.,][\dOos]+)?)\s*$')),  # "G 300.0" (G иногда читается как 6)
+    ('number', re.compile(r'^\s*(\d+(?:[.,]\d+)?)\s*$')),         # число без маркера
+    ('badge', re.compile(r'^\s*(ST|R|U)\s*$', re.IGNORECASE)),    # значок StatTrack/редкости
+]
+RULE_INDEX = {kind: index for index, (kind, _) in enumerate(LINE_RULES)}
+UNKNOWN = len(LINE_RULES)
+COUNT, WT, PRICE, NUMBER, BADGE = (RULE_INDEX[kind] for kind in ('count', 'wt', 'price', 'number', 'badge'))
+
+# Строки названия короче этого считаются мусором OCR (как в test2.parse_card_text)
+MIN_NAME_LENGTH = 3
+
+# Исправление типичных ошибок OCR в цене
+PRICE_FIXES = str.maketrans({'O': '0', 'o': '0', 's': '5', ',': '.'})
+
+
+@lru_cache(maxsize=4096)
+def classify_line(text: str) -> Tuple[int, Optional[str]]:
+    """Тип строки по первому совпавшему правилу и захваченное значение (с кэшем: названия повторяются)"""
+    for index, (_, pattern) in enumerate(LINE_RULES):
+        match = pattern.match(text)
+        if match:
+            return index, match.group(1) if pattern.groups else match.group(0)
+    return UNKNOWN, None
+
+
+class CardFieldParser:
+    """Разбирает результаты EasyOCR всей карточки на название, количество и цену.
+
+    Строки классифицируются скомпилированными правилами. Обычно этого
+    достаточно: одна строка количества ("701 wt" или число перед "wt"),
+    одна строка цены ("G 300.0") и одна строка названия. Положение рамок
+    используется только для неоднозначных карточек (маркер не распознан,
+    несколько кандидатов, несколько строк текста): количество — слева в
+    нижней полосе, цена — справа, название — в блоке текста над ней.
+    """
+
+    def __init__(self, name_corrector: Optional[Callable[[str], str]] = None, stattrack_prefix: str = 'StatTrack ',
+                 field_ratios: Optional[Dict[str, float]] = None):
+        self.name_corrector = name_corrector
+        self.stattrack_prefix = stattrack_prefix
+        ratios = field_ratios or FIELD_RATIOS
+        self.text_top = 1 - ratios['text']
+        self.row_top = 1 - ratios['count_and_price']
+        # Граница между количеством и ценой — середина перекрытия их регионов
+        self.price_left = (ratios['price_left'] + ratios['count_right']) / 2
+
+    @staticmethod
+    def classify(text: str) -> Tuple[int, Optional[str]]:
+        """Возвращает индекс правила и захваченное значение строки"""
+        return classify_line(text)
+
+    def parse(self, results: List[OCRResult], card_shape: Tuple[int, ...],
+              is_stattrack: bool = False) -> Tuple[Dict, bool]:
+        """Разбирает одну карточку: (данные карточки, полнота)"""
+        lines = [(text,) + classify_line(text) for _, text, _ in results]
+        fields = self.fields_by_rules(lines)
+        if fields is None:
+            fields = self.fields_by_geometry(results, lines, card_shape)
+        return self._assemble(*fields, is_stattrack)
+
+    @staticmethod
+    def fields_by_rules(lines: List[Tuple[str, int, Optional[str]]]) -> Optional[Tuple[List[str], bool, Optional[str], Optional[str]]]:
+        """Быстрый путь: поля однозначно определяются типами строк (None, если нет)"""
+        counts = []
+        prices = []
+        names = []
+        badge = False
+        for i, (text, kind, value) in enumerate(lines):
+            if kind == COUNT:
+                counts.append(value)
+            elif kind == NUMBER and i + 1 < len(lines) and lines[i + 1][1] == WT:
+                counts.append(value)
+            elif kind == PRICE:
+                prices.append(value)
+            elif kind == BADGE:
+                badge = True
+            elif kind == UNKNOWN and len(text.strip()) >= MIN_NAME_LENGTH:
+                names.append(text)
+            elif kind == NUMBER:
+                # Число без маркера: неясно, количество это или цена
+                return None
+        # Несколько строк текста — название в две строки или надпись на картинке: решает геометрия
+        if len(counts) != 1 or len(prices) != 1 or len(names) > 1:
+            return None
+        return names, badge, counts[0], prices[0]
+
+    def fields_by_geometry(self, results: List[OCRResult], lines: List[Tuple[str, int, Optional[str]]],
+                           card_shape: Tuple[int, ...]) -> Tuple[List[str], bool, Optional[str], Optional[str]]:
+        """Медленный путь: поля по положению рамок в карточке"""
+        height, width = card_shape[:2]
+        count = price = None
+        names = []
+        badge = False
+        # Строки сверху вниз, слева направо
+        placed = []
+        for (box, _, _), line in zip(results, lines):
+            xs = [float(point[0]) for point in box]
+            ys = [float(point[1]) for point in box]
+            placed.append((round(sum(ys) / len(ys) / height, 2), min(xs) / width, sum(xs) / len(xs) / width, line))
+        placed.sort(key=lambda item: item[:2])
+
+        for cy, _, cx, (text, kind, value) in placed:
+            in_row = cy >= self.row_top
+            if kind in (COUNT, NUMBER) and in_row and cx < self.price_left and count is None:
+                count = value
+            elif kind in (PRICE, NUMBER) and in_row and cx >= self.price_left and price is None:
+                price = value
+            elif cy >= self.text_top and not in_row:
+                if kind == BADGE:
+                    badge = True
+                elif kind == UNKNOWN:
+                    names.append(text)
+
+        # Вне ожидаемых зон — только строки с явным маркером
+        if count is None:
+            count = next((value for _, _, _, (_, kind, value) in placed if kind == COUNT), None)
+        if price is None:
+            price = next((value for _, _, _, (_, kind, value) in placed if kind == PRICE), None)
+        return names, badge, count, price
+
+    def _assemble(self, names: List[str], badge: bool, count_value: Optional[str], price_value: Optional[str],
+                  is_stattrack: bool) -> Tuple[Dict, bool]:
+        card_data = {"Name": "", "Count(WT)": 0, "Price": 0.0}
+        is_complete = True
+
+        name = ' '.join(text.strip() for text in names if len(text.strip()) >= MIN_NAME_LENGTH)
+        if name and self.name_corrector:
+            name = self.name_corrector(name)
+        if name and (is_stattrack or badge):
+            name = self.stattrack_prefix + name
+        if not name:
+            is_complete = False
+            card_data["error"] = "Name is empty"
+        card_data["Name"] = name
+
+        count = int(float(count_value.replace(',', '.'))) if count_value is not None else 0
+        if count_value is None:
+            is_complete = False
+            card_data["error"] = "Count(WT) or wt marker not found"
+        elif count <= 0:
+            is_complete = False
+            card_data["error"] = "Invalid Count(WT)"
+        card_data["Count(WT)"] = count
+
+        price = 0.0
+        if price_value is not None:
+            try:
+                price = float(price_value.translate(PRICE_FIXES))
+            except ValueError:
+                price = 0.0
+        if price <= 0:
+            is_complete = False
+            card_data["error"] = "Invalid Price"
+        card_data["Price"] = price
+
+        return card_data, is_complete
@@ -0,0 +1,68 @@
+import random
+import sys
+import cv2
+import numpy as np
+from overlap import ScrollOverlapDetector
+
+CARD_SIZE = (170, 210)  # ширина, высота карточки на скриншоте
+COLS = 4
+
+
+def make_card(rng, art_seed, name, count, price):
+    """Синтетическая карточка: картинка предмета по art_seed и строки текста"""
+    width, height = CARD_SIZE
+    card = np.full((height, width, 3), 35, np.uint8)
+    art = random.Random(art_seed)
+    for _ in range(4):
+        color = tuple(art.randint(60, 255) for _ in range(3))
+        center = (art.randint(30, width - 30), art.randint(20, 110))
+        cv2.circle(card, center, art.randint(10, 30), color, -1)
+    cv2.putText(card, name, (6, 150), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (230, 230, 230), 1)
+    cv2.putText(card, f"{count} wt", (6, 200), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (230, 230, 230), 1)
+    cv2.putText(card, f"G {price}", (92, 200), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (230, 230, 230), 1)
+    # Шум сжатия скриншота
+    noise = np.random.default_rng(rng.randint(0, 1 << 30)).integers(-3, 4, card.shape)
+    return np.clip(card.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+
+
+def make_listing(rng, art_seed=None):
+    """Параметры одного лота; art_seed=None — случайный предмет"""
+    seed = rng.randint(0, 1000) if art_seed is None else art_seed
+    return seed, f"Item {seed}", rng.randint(1, 999), f"{rng.randint(1, 9999)}.{rng.randint(0, 9)}"
+
+
+def render(rng, listings):
+    return [make_card(rng, *listing) for listing in listings]
+
+
+def check(title, expected, first_screen, second_screen):
+    detector = ScrollOverlapDetector()
+    detector.first_new_row(first_screen, COLS)
+    result = detector.first_new_row(second_screen, COLS)
+    status = "OK" if result == expected else "ОШИБКА"
+    print(f"{status}: {title}: первая новая строка {result}, ожидалась {expected}")
+    return result == expected
+
+
+def main(seed=0):
+    rng = random.Random(seed)
+    ok = True
+
+    # Прокрутка на одну строку: вторая строка первого скриншота стала первой
+    listings = [make_listing(rng) for _ in range(3 * COLS)]
+    ok &= check("прокрутка на строку", 1, render(rng, listings[:2 * COLS]), render(rng, listings[COLS:]))
+
+    # Рынок отсортирован по предмету: та же картинка и название, другие цены и количества
+    same_item = [make_listing(rng, art_seed=7) for _ in range(4 * COLS)]
+    ok &= check("тот же предмет, другие цены", 0, render(rng, same_item[:2 * COLS]), render(rng, same_item[2 * COLS:]))
+
+    # Отличается только цена одной карточки перекрывающейся строки
+    changed = list(listings[COLS:])
+    art_seed, name, count, _ = changed[0]
+    changed[0] = (art_seed, name, count, "0.1")
+    ok &= check("изменилась одна цена", 0, render(rng, listings[:2 * COLS]), render(rng, changed))
+
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import cv2
+import numpy as np
+import os
+import queue
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+
+class DebugArtifactSink:
+    """Отладочные изображения карточек, записываемые в фоне.
+
+    По умолчанию выключен. Карточки отбираются по одной из sample_every;
+    при only_incomplete изображения карточки записываются, только если она
+    разобрана не полностью. Файлы пишет фоновый поток из ограниченной
+    очереди: если очередь заполнена, артефакты отбрасываются, а не
+    тормозят обработку. Имена файлов содержат идентификатор карточки.
+
+    Порядок работы: wants(card_id) — нужно ли готовить изображения;
+    stage(card_id, name, image) — добавить изображение; commit(card_id,
+    is_complete) — карточка обработана, отправить её изображения на запись.
+    """
+
+    def __init__(self, output_dir: str = 'testscreen', enabled: bool = False, sample_every: int = 1,
+                 only_incomplete: bool = False, max_queue: int = 64):
+        self.output_dir = output_dir
+        self.enabled = enabled
+        self.sample_every = max(1, sample_every)
+        self.only_incomplete = only_incomplete
+        self.queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self.staged: Dict[str, Optional[List[Tuple[str, np.ndarray]]]] = {}
+        self.seen = 0
+        self.dropped = 0
+        self.thread: Optional[threading.Thread] = None
+
+    def wants(self, card_id: str) -> bool:
+        """Решает (один раз на карточку), попадает ли карточка в выборку"""
+        if not self.enabled:
+            return False
+        if card_id not in self.staged:
+            sampled = self.seen % self.sample_every == 0
+            self.seen += 1
+            self.staged[card_id] = [] if sampled else None
+        return self.staged[card_id] is not None
+
+    def stage(self, card_id: str, name: str, image: np.ndarray) -> None:
+        """Запоминает копию изображения карточки до вызова commit"""
+        if self.wants(card_id):
+            # Копия: исходный массив может быть слотом разделяемой памяти или срезом
+            self.staged[card_id].append((name, np.array(image, copy=True)))
+
+    def commit(self, card_id: str, is_complete: Optional[bool] = None) -> None:
+        """Отправляет изображения карточки на запись (или отбрасывает их)"""
+        artifacts = self.staged.pop(card_id, None)
+        if not artifacts or (self.only_incomplete and is_complete):
+            return
+        self._ensure_thread()
+        for name, image in artifacts:
+            try:
+                self.queue.put_nowait((card_id, name, image))
+            except queue.Full:
+                self.dropped += 1
+
+    def _ensure_thread(self) -> None:
+        if self.thread is None:
+            os.makedirs(self.output_dir, exist_ok=True)
+            self.thread = threading.Thread(target=self._write_loop, daemon=True)
+            self.thread.start()
+
+    def _write_loop(self) -> None:
+        """Фоновая запись изображений из очереди"""
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            card_id, name, image = item
+            safe_id = re.sub(r'[^\w.-]+', '_', os.path.splitext(card_id)[0])
+            output_path = os.path.join(self.output_dir, f'{safe_id}_{name}.png')
+            try:
+                cv2.imwrite(output_path, image, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+            except Exception as e:
+                print(f"Ошибка при сохранении отладочного изображения {output_path}: {e}")
+
+    def close(self) -> None:
+        """Дожидается записи всех поставленных в очередь изображений"""
+        self.staged.clear()
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+        if self.dropped:
+            print(f"Отброшено отладочных изображений из-за переполненной очереди: {self.dropped}")
@@ -0,0 +1,223 @@
+import cv2
+import numpy as np
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+from layout import extract_fields
+from intermediates import iter_labelled_cards
+
+# Слово текста, из которого строятся шаблоны: только символы числа
+NUMBER_WORD = re.compile(r'^\d+(?:[.,]\d+)?$')
+
+
+class DigitReader:
+    """Читает числовые поля карточки (количество и цену) сопоставлением с шаблонами глифов.
+
+    Поля отрисованы одним шрифтом игры, поэтому вместо нейросети достаточно
+    нарезать строку на глифы и сравнить их со средними шаблонами символов,
+    собранными по размеченным примерам. Шаблоны строятся только для цифр
+    и разделителя, а приставка "G" и суффикс "wt" при чтении пропускаются.
+    """
+
+    def __init__(self, templates_file: str = 'json/digit_templates.npz', glyph_size: int = 20,
+                 min_score: float = 0.7):
+        self.templates_file = templates_file
+        self.glyph_size = glyph_size
+        self.min_score = min_score
+        self.chars: List[str] = []
+        self.templates = np.empty((0, glyph_size * glyph_size), dtype=np.float32)
+        self.load_templates()
+
+    @property
+    def is_ready(self) -> bool:
+        """Есть ли загруженные шаблоны"""
+        return len(self.chars) > 0
+
+    def load_templates(self) -> None:
+        """Загружает шаблоны глифов из файла, если он существует"""
+        if not os.path.exists(self.templates_file):
+            return
+        data = np.load(self.templates_file)
+        self.chars = [str(c) for c in data['chars']]
+        self.templates = data['templates'].astype(np.float32)
+        self.glyph_size = int(data['glyph_size'])
+
+    def save_templates(self) -> None:
+        """Сохраняет шаблоны глифов в файл"""
+        folder = os.path.dirname(self.templates_file)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        np.savez(self.templates_file, chars=np.array(self.chars), templates=self.templates,
+                 glyph_size=self.glyph_size)
+
+    def _binarize(self, image: np.ndarray) -> np.ndarray:
+        """Переводит регион в бинарную маску, где текст — единицы"""
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        _, mask = cv2.threshold(gray, 0, 1, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        # Текст занимает меньшую часть региона
+        if mask.mean() > 0.5:
+            mask = 1 - mask
+        return mask
+
+    def segment(self, image: np.ndarray) -> Tuple[np.ndarray, List[bool]]:
+        """Нарезает строку на глифы.
+
+        Возвращает матрицу нормализованных глифов (по строке на глиф) и
+        для каждого глифа флаг, стоит ли перед ним пробел.
+        """
+        mask = self._binarize(image)
+        size = self.glyph_size
+
+        # Полоса строки — самая длинная непрерывная группа строк пикселей с текстом
+        rows = np.flatnonzero(np.diff(np.concatenate(([0], mask.any(axis=1).astype(np.int8), [0]))))
+        if len(rows) < 2:
+            return np.empty((0, size * size), dtype=np.float32), []
+        starts, ends = rows[::2], rows[1::2]
+        longest = int(np.argmax(ends - starts))
+        band = mask[starts[longest]:ends[longest]]
+        line_height = band.shape[0]
+
+        cols = np.flatnonzero(np.diff(np.concatenate(([0], band.any(axis=0).astype(np.int8), [0]))))
+        col_starts, col_ends = cols[::2], cols[1::2]
+
+        glyphs = []
+        spaces = []
+        for i, (x0, x1) in enumerate(zip(col_starts, col_ends)):
+            glyph = band[:, x0:x1]
+            # Дополняем до квадрата высотой строки, чтобы сохранить пропорции глифа
+            width = glyph.shape[1]
+            if width < line_height:
+                pad = line_height - width
+                glyph = np.pad(glyph, ((0, 0), (pad // 2, pad - pad // 2)))
+            glyphs.append(cv2.resize(glyph.astype(np.float32), (size, size), interpolation=cv2.INTER_AREA).ravel())
+            spaces.append(i > 0 and x0 - col_ends[i - 1] > line_height * 0.35)
+
+        if not glyphs:
+            return np.empty((0, size * size), dtype=np.float32), []
+        return np.stack(glyphs), spaces
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        """Центрирует и нормирует векторы для корреляции"""
+        vectors = vectors - vectors.mean(axis=1, keepdims=True)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-6)
+
+    @staticmethod
+    def _words(spaces: List[bool]) -> List[Tuple[int, int]]:
+        """Границы слов [(начало, конец)] в последовательности глифов по флагам пробелов"""
+        starts = [i for i, space in enumerate(spaces) if i == 0 or space]
+        return list(zip(starts, starts[1:] + [len(spaces)]))
+
+    def build_templates(self, samples: List[Tuple[np.ndarray, str]]) -> int:
+        """Строит шаблоны символов числа по размеченным примерам (регион, текст).
+
+        Из текста берётся только число ("701" из "701 wt", "300.0" из
+        "G 300.0"); остальные символы не учитываются, поэтому склеенные
+        глифы вроде "wt" не мешают. Глифы числа — его слово в строке, а если
+        число слов не совпало, то столько же глифов с начала или конца
+        строки. Возвращает количество использованных примеров.
+        """
+        sums: Dict[str, np.ndarray] = {}
+        counts: Dict[str, int] = {}
+        used = 0
+        for image, text in samples:
+            words = text.split()
+            number_words = [i for i, word in enumerate(words) if NUMBER_WORD.match(word)]
+            glyphs, spaces = self.segment(image)
+            if not number_words or not len(glyphs):
+                continue
+            index = number_words[0]
+            number = words[index]
+            glyph_words = self._words(spaces)
+            if len(glyph_words) == len(words):
+                start, end = glyph_words[index]
+            elif index == 0:
+                start, end = 0, len(number)
+            elif index == len(words) - 1:
+                start, end = len(glyphs) - len(number), len(glyphs)
+            else:
+                continue
+            if start < 0 or end - start != len(number) or end > len(glyphs):
+                continue
+            for char, glyph in zip(number, glyphs[start:end]):
+                sums[char] = sums.get(char, 0) + glyph
+                counts[char] = counts.get(char, 0) + 1
+            used += 1
+
+        self.chars = sorted(sums)
+        if self.chars:
+            self.templates = self._normalize(np.stack([sums[c] / counts[c] for c in self.chars]))
+        return used
+
+    def _match(self, glyphs: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Лучший шаблон и его корреляция для каждого глифа (одним матричным умножением)"""
+        scores = self._normalize(glyphs) @ self.templates.T
+        best = scores.argmax(axis=1)
+        return best, scores[np.arange(len(best)), best]
+
+    def read(self, image: np.ndarray) -> Optional[str]:
+        """Распознаёт строку региона целиком.
+
+        Возвращает None, если шаблонов нет или хотя бы один глиф совпал хуже
+        порога — тогда вызывающий код должен использовать EasyOCR.
+        """
+        if not self.is_ready:
+            return None
+        glyphs, spaces = self.segment(image)
+        if not len(glyphs):
+            return None
+        best, scores = self._match(glyphs)
+        if scores.min() < self.min_score:
+            return None
+        return ''.join((' ' if space else '') + self.chars[i] for i, space in zip(best, spaces))
+
+    def read_number(self, image: np.ndarray, from_end: bool = False) -> Optional[str]:
+        """Распознаёт число в начале строки (количество: "701 wt") или в конце (цена: "G 300.0").
+
+        Берётся слово у края строки (до пробела), приставка и суффикс не
+        читаются. Возвращает None, если шаблонов нет или хотя бы один глиф
+        этого слова совпал хуже порога (например, склеились две цифры).
+        """
+        if not self.is_ready:
+            return None
+        glyphs, spaces = self.segment(image)
+        if not len(glyphs):
+            return None
+        best, scores = self._match(glyphs)
+
+        indices = range(len(glyphs) - 1, -1, -1) if from_end else range(len(glyphs))
+        run = []
+        for i in indices:
+            # Пробел перед глифом i отделяет его от предыдущего слова
+            if run and spaces[run[-1] if from_end else i]:
+                break
+            # Нераспознанный глиф внутри слова числа — скорее всего склеенные цифры
+            if scores[i] < self.min_score:
+                return None
+            run.append(i)
+        return ''.join(self.chars[best[i]] for i in sorted(run))
+
+
+def load_labelled_samples(labels_json: str, images_folder: str) -> List[Tuple[np.ndarray, str]]:
+    """Собирает примеры регионов количества и цены по размеченным карточкам (all_card_data.json)"""
+    samples = []
+    for card, image in iter_labelled_cards(labels_json, images_folder):
+        _, count_region, price_region = extract_fields(image)
+        samples.append((count_region, f"{card['Count(WT)']} wt"))
+        samples.append((price_region, f"G {card['Price']}"))
+    return samples
+
+
+def main():
+    digit_reader = DigitReader()
+    samples = load_labelled_samples('all_card_data.json', 'ready_screenshots')
+    used = digit_reader.build_templates(samples)
+    if not digit_reader.is_ready:
+        print("Не удалось построить шаблоны: нет подходящих примеров")
+        return
+    digit_reader.save_templates()
+    print(f"Шаблоны {len(digit_reader.chars)} символов построены по {used}/{len(samples)} примерам")
+
+if __name__ == "__main__":
+    main()
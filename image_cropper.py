@@ -1,17 +1,20 @@
-from PIL import Image
+import cv2
 import os
+from layout import LayoutCalibrator
+from intermediates import IntermediateWriter
+from archive_input import iter_input_images
 
 class ImageCropper:
-    def __init__(self, input_folder='main_screenshots', output_folder='processed_screenshots'):
+    # input_folder — папка, файл, zip/tar архив, маска (sessions/*.zip) или список таких путей
+    def __init__(self, input_folder='main_screenshots', output_folder='processed_screenshots', layout_cache='json/layout_cache.json',
+                 output_format='png', png_compression=1, recalibrate=False):
         self.input_folder = input_folder
         self.output_folder = output_folder
         self.index = 0
-        self.crop_percentages = {
-            'top': 0.185,
-            'bottom': 0.035,
-            'left': 0.27,
-            'right': 0.015
-        }
+        # recalibrate=True заменяет сохранённую разметку (например, после смены интерфейса игры)
+        self.calibrator = LayoutCalibrator(cache_file=layout_cache, detect_panel=True, recalibrate=recalibrate)
+        # Формат промежуточных файлов: png, npy или batch (см. intermediates.py)
+        self.writer = IntermediateWriter(output_folder, output_format, png_compression, prefix='img')
     
     def setup_output_folder(self):
         """Создает выходную папку, если она не существует"""
@@ -25,35 +28,30 @@ class ImageCropper:
         """Проверяет, является ли файл изображением с допустимым расширением"""
         return filename.lower().endswith(('.png', '.jpg', '.jpeg'))
     
-    def calculate_crop_coordinates(self, width, height):
-        """Вычисляет координаты для обрезки на основе размеров изображения"""
-        left = int(width * self.crop_percentages['left'])
-        top = int(height * self.crop_percentages['top'])
-        right = int(width * (1 - self.crop_percentages['right']))
-        bottom = int(height * (1 - self.crop_percentages['bottom']))
-        return (left, top, right, bottom)
-    
     def process_image(self, image_path):
         """Обрабатывает одно изображение"""
         try:
-            image = Image.open(image_path)
-            width, height = image.size
-            crop_coords = self.calculate_crop_coordinates(width, height)
-            cropped_image = image.crop(crop_coords)
-            self._save_image(cropped_image)
-            self.index += 1
-            return True
+            image = cv2.imread(image_path)
+            if image is None:
+                raise ValueError("не удалось прочитать файл")
+            return self.process_screenshot(image)
         except Exception as e:
             raise Exception(f"Ошибка при обработке изображения {image_path}: {e}")
     
+    def process_screenshot(self, image):
+        """Обрабатывает одно уже декодированное изображение"""
+        # Панель вырезается срезом массива, без копирования
+        cropped_image = self.calibrator.get_layout(image).panel_view(image)
+        self._save_image(cropped_image)
+        self.index += 1
+        return True
+    
     def _save_image(self, image):
         """Сохраняет обработанное изображение"""
         try:
-            output_filename = f"img{self.index}.png"
-            output_path = os.path.join(self.output_folder, output_filename)
-            image.save(output_path, format='png', quality=100)
+            self.writer.write([image])
         except Exception as e:
-            raise Exception(f"Ошибка при сохранении изображения {output_path}: {e}")
+            raise Exception(f"Ошибка при сохранении изображения img{self.index}: {e}")
     
     def crop_all_images(self):
         """Обрабатывает все изображения в входной папке"""
@@ -62,12 +60,15 @@ class ImageCropper:
         try:
             self.setup_output_folder()
             
-            for filename in os.listdir(self.input_folder):
-                if self.is_valid_image(filename):
-                    image_path = os.path.join(self.input_folder, filename)
-                    if self.process_image(image_path):
+            # Изображения из архивов декодируются прямо из памяти, без распаковки на диск
+            for filename, image in iter_input_images(self.input_folder):
+                try:
+                    if self.process_screenshot(image):
                         processed_count += 1
+                except Exception as e:
+                    raise Exception(f"Ошибка при обработке изображения {filename}: {e}")
             
+            self.writer.close()
             return processed_count
             
         except Exception as e:
@@ -0,0 +1,162 @@
+import cv2
+import numpy as np
+import json
+import os
+import re
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Форматы промежуточных файлов между этапами:
+#   png   — PNG с настраиваемым сжатием (0 — без сжатия, 9 — максимальное)
+#   npy   — один .npy на скриншот (для сплиттера — стопка карточек скриншота)
+#   batch — один отображаемый в память .npy на пачку изображений одного размера
+INTERMEDIATE_FORMATS = ('png', 'npy', 'batch')
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+# Фиксированный размер заголовка .npy пачки, чтобы дописать итоговую длину на место
+_BATCH_HEADER_SIZE = 128
+
+
+def natural_key(filename: str) -> List:
+    """Ключ сортировки, при котором card_2 идёт раньше card_10"""
+    return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', filename)]
+
+
+class BatchFile:
+    """Пачка изображений одного размера в одном .npy, записываемая по мере поступления"""
+
+    def __init__(self, path: str, shape: Tuple[int, ...], dtype=np.uint8):
+        self.path = path
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.count = 0
+        self.file = open(path, 'wb')
+        self._write_header()
+
+    def _write_header(self) -> None:
+        header = repr({'descr': np.lib.format.dtype_to_descr(self.dtype), 'fortran_order': False,
+                       'shape': (self.count,) + self.shape})
+        prefix_size = len(np.lib.format.MAGIC_PREFIX) + 2 + 2
+        header = header.ljust(_BATCH_HEADER_SIZE - prefix_size - 1) + '\n'
+        self.file.seek(0)
+        self.file.write(np.lib.format.MAGIC_PREFIX + bytes([1, 0]))
+        self.file.write(len(header).to_bytes(2, 'little'))
+        self.file.write(header.encode('latin1'))
+
+    def append(self, image: np.ndarray) -> None:
+        """Дописывает изображение в конец пачки"""
+        self.file.seek(0, os.SEEK_END)
+        self.file.write(np.ascontiguousarray(image, dtype=self.dtype).tobytes())
+        self.count += 1
+
+    def close(self) -> None:
+        """Записывает итоговое число изображений в заголовок и закрывает файл"""
+        self._write_header()
+        self.file.close()
+
+
+class IntermediateWriter:
+    """Записывает промежуточные изображения этапа в выбранном формате"""
+
+    def __init__(self, output_folder: str, output_format: str = 'png', png_compression: int = 1,
+                 prefix: str = 'card_'):
+        if output_format not in INTERMEDIATE_FORMATS:
+            raise ValueError(f"Неизвестный формат {output_format}, допустимые: {', '.join(INTERMEDIATE_FORMATS)}")
+        self.output_folder = output_folder
+        self.output_format = output_format
+        self.png_compression = png_compression
+        self.prefix = prefix
+        self.index = 0
+        self.group_index = 0
+        self.batch: Optional[BatchFile] = None
+        self.batch_index = 0
+
+    def write(self, images: List[np.ndarray]) -> None:
+        """Записывает группу изображений (например, карточки одного скриншота)"""
+        if self.output_format == 'png':
+            for image in images:
+                output_path = os.path.join(self.output_folder, f'{self.prefix}{self.index}.png')
+                cv2.imwrite(output_path, image, [cv2.IMWRITE_PNG_COMPRESSION, self.png_compression])
+                self.index += 1
+        elif self.output_format == 'npy':
+            output_path = os.path.join(self.output_folder, f'{self.prefix}stack_{self.group_index}.npy')
+            np.save(output_path, np.stack(images))
+            self.index += len(images)
+        else:
+            for image in images:
+                if self.batch is None or self.batch.shape != image.shape:
+                    self._next_batch(image.shape)
+                self.batch.append(image)
+                self.index += 1
+        self.group_index += 1
+
+    def _next_batch(self, shape: Tuple[int, ...]) -> None:
+        """Закрывает текущую пачку и начинает новую для изображений другого размера"""
+        if self.batch is not None:
+            self.batch.close()
+        output_path = os.path.join(self.output_folder, f'{self.prefix}batch_{self.batch_index}.npy')
+        self.batch = BatchFile(output_path, shape)
+        self.batch_index += 1
+
+    def close(self) -> None:
+        """Завершает запись открытой пачки"""
+        if self.batch is not None:
+            self.batch.close()
+            self.batch = None
+
+
+def is_intermediate_file(filename: str) -> bool:
+    """Проверяет, является ли файл изображением или .npy этапа"""
+    return filename.lower().endswith(IMAGE_EXTENSIONS + ('.npy',))
+
+
+def count_intermediates(folder: str) -> int:
+    """Считает изображения папки без декодирования (для .npy читается только заголовок)"""
+    total = 0
+    for filename in os.listdir(folder):
+        if not is_intermediate_file(filename):
+            continue
+        if filename.lower().endswith('.npy'):
+            array = np.load(os.path.join(folder, filename), mmap_mode='r')
+            total += len(array) if array.ndim == 4 else 1
+        else:
+            total += 1
+    return total
+
+
+def iter_intermediates(folder: str) -> Iterator[Tuple[str, np.ndarray]]:
+    """Перебирает изображения папки в порядке имён: (имя, массив BGR).
+
+    Файлы .npy открываются через отображение в память, поэтому карточки
+    из стопок и пачек отдаются без декодирования и чтения всего файла.
+    """
+    for filename in sorted(os.listdir(folder), key=natural_key):
+        if not is_intermediate_file(filename):
+            continue
+        path = os.path.join(folder, filename)
+        if filename.lower().endswith('.npy'):
+            array = np.load(path, mmap_mode='r')
+            if array.ndim == 4:
+                stem = os.path.splitext(filename)[0]
+                for i in range(len(array)):
+                    yield f'{stem}_{i}', array[i]
+            else:
+                yield filename, array
+        else:
+            image = cv2.imread(path)
+            if image is not None:
+                yield filename, image
+
+
+def iter_labelled_cards(labels_json: str, folder: str) -> Iterator[Tuple[Dict, np.ndarray]]:
+    """Перебирает размеченные карточки (all_card_data.json) с их изображениями из папки любого формата.
+
+    Разметка сопоставляется по image_name с именами iter_intermediates,
+    поэтому карточки из стопок и пачек .npy тоже находятся.
+    """
+    with open(labels_json, 'r', encoding='utf-8') as f:
+        labels: Dict[str, List[Dict]] = {}
+        for card in json.load(f):
+            labels.setdefault(card.get('image_name', ''), []).append(card)
+    for image_name, image in iter_intermediates(folder):
+        for card in labels.get(image_name, []):
+            yield card, image
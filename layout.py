@@ -0,0 +1,266 @@
+import cv2
+import numpy as np
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+# Отступы панели рынка на полном скриншоте (доли размера), если линии не найдены
+DEFAULT_PANEL = {
+    'top': 0.185,
+    'bottom': 0.035,
+    'left': 0.27,
+    'right': 0.015
+}
+
+# Регионы текста внутри карточки (доли размера карточки)
+FIELD_RATIOS = {
+    'text': 0.37,              # высота блока текста снизу карточки
+    'count_and_price': 0.18,   # высота строки количества и цены
+    'count_right': 0.5,        # правая граница региона количества
+    'price_left': 0.4          # левая граница региона цены
+}
+
+DEFAULT_GRID = (2, 4)
+ROW_CANDIDATES = (2, 3, 4)
+COL_CANDIDATES = (3, 4, 5, 6)
+
+
+class Layout:
+    """Разметка скриншота: прямоугольник панели рынка и сетка карточек.
+
+    Все вырезки возвращаются как срезы NumPy (views) исходного массива,
+    без копирования пикселей.
+    """
+
+    def __init__(self, panel: Tuple[int, int, int, int], rows: int, cols: int,
+                 field_ratios: Optional[Dict[str, float]] = None):
+        self.panel = tuple(int(v) for v in panel)  # (left, top, right, bottom)
+        self.rows = rows
+        self.cols = cols
+        self.field_ratios = dict(field_ratios or FIELD_RATIOS)
+
+    @property
+    def card_size(self) -> Tuple[int, int]:
+        """Размер карточки (ширина, высота)"""
+        left, top, right, bottom = self.panel
+        return (right - left) // self.cols, (bottom - top) // self.rows
+
+    def panel_view(self, screenshot: np.ndarray) -> np.ndarray:
+        """Возвращает панель рынка"""
+        left, top, right, bottom = self.panel
+        return screenshot[top:bottom, left:right]
+
+    def card_view(self, screenshot: np.ndarray, row: int, col: int) -> np.ndarray:
+        """Возвращает одну карточку сетки"""
+        left, top, _, _ = self.panel
+        card_width, card_height = self.card_size
+        x = left + col * card_width
+        y = top + row * card_height
+        return screenshot[y:y + card_height, x:x + card_width]
+
+    def cards(self, screenshot: np.ndarray) -> List[np.ndarray]:
+        """Возвращает все карточки построчно"""
+        return [self.card_view(screenshot, row, col) for row in range(self.rows) for col in range(self.cols)]
+
+    def to_dict(self) -> Dict:
+        return {'panel': list(self.panel), 'rows': self.rows, 'cols': self.cols, 'field_ratios': self.field_ratios}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'Layout':
+        return cls(data['panel'], data['rows'], data['cols'], data.get('field_ratios'))
+
+
+def extract_fields(card: np.ndarray, ratios: Optional[Dict[str, float]] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Возвращает регионы названия, количества и цены карточки (views)"""
+    ratios = ratios or FIELD_RATIOS
+    hi, wi = card.shape[:2]
+    text_top = hi - int(hi * ratios['text'])
+    row_height = int(hi * ratios['count_and_price'])
+
+    name_region = card[text_top:text_top + row_height, :]
+    count_and_price = card[hi - row_height:hi, :]
+    count_region = count_and_price[:, :int(wi * ratios['count_right'])]
+    price_region = count_and_price[:, int(wi * ratios['price_left']):]
+    return name_region, count_region, price_region
+
+
+class LayoutCalibrator:
+    """Определяет разметку скриншота по профилям границ и кэширует её по разрешению.
+
+    В кэш попадает только уверенная калибровка (все линии панели и сетка
+    найдены по профилям, а не взяты по умолчанию), подтверждённая
+    min_agreement скриншотами подряд с совпадающей разметкой. Пока кэша
+    нет, каждый скриншот калибруется отдельно, поэтому загрузочный экран
+    или диалог не испортит разметку следующих сессий. recalibrate=True
+    игнорирует сохранённые разметки и заменяет их новыми.
+    """
+
+    def __init__(self, cache_file: str = 'json/layout_cache.json', detect_panel: bool = True,
+                 grid: Optional[Tuple[int, int]] = None, min_agreement: int = 3, recalibrate: bool = False,
+                 tolerance: float = 0.01):
+        self.cache_file = cache_file
+        self.detect_panel = detect_panel
+        self.grid = grid
+        self.min_agreement = max(1, min_agreement)
+        self.tolerance = tolerance
+        self.cache: Dict[str, Dict] = {}
+        # Кандидаты, ещё не подтверждённые нужным числом скриншотов
+        self.pending: Dict[str, List[Layout]] = {}
+        self._load_cache()
+        self.stale = set(self.cache) if recalibrate else set()
+
+    def _load_cache(self) -> None:
+        """Загружает кэш разметок"""
+        if not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                self.cache = json.load(f)
+        except (json.JSONDecodeError, ValueError):
+            self.cache = {}
+
+    def _save_cache(self) -> None:
+        """Сохраняет кэш разметок"""
+        folder = os.path.dirname(self.cache_file)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with open(self.cache_file, 'w', encoding='utf-8') as f:
+            json.dump(self.cache, f, ensure_ascii=False, indent=4)
+
+    def _cache_key(self, width: int, height: int) -> str:
+        mode = 'screen' if self.detect_panel else 'panel'
+        grid = f"{self.grid[0]}x{self.grid[1]}" if self.grid else 'auto'
+        return f"{width}x{height}:{mode}:{grid}"
+
+    def invalidate(self, width: Optional[int] = None, height: Optional[int] = None) -> None:
+        """Удаляет из кэша разметку разрешения (или все разметки, если оно не задано)"""
+        if width is None or height is None:
+            self.cache.clear()
+        else:
+            self.cache.pop(self._cache_key(width, height), None)
+        self.pending.clear()
+        self._save_cache()
+
+    def _agrees(self, first: Layout, second: Layout, width: int, height: int) -> bool:
+        """Совпадают ли две разметки с точностью до tolerance размера скриншота"""
+        if (first.rows, first.cols) != (second.rows, second.cols):
+            return False
+        limits = (width, height, width, height)
+        return all(abs(a - b) <= limit * self.tolerance for a, b, limit in zip(first.panel, second.panel, limits))
+
+    def get_layout(self, screenshot: np.ndarray) -> Layout:
+        """Возвращает разметку из кэша или калибрует её по скриншоту"""
+        height, width = screenshot.shape[:2]
+        key = self._cache_key(width, height)
+        if key in self.cache and key not in self.stale:
+            return Layout.from_dict(self.cache[key])
+
+        layout, confident = self.calibrate_with_confidence(screenshot)
+        if not confident:
+            return layout
+
+        # Подтверждение: min_agreement уверенных калибровок подряд с одинаковой разметкой
+        candidates = self.pending.get(key, [])
+        if candidates and not self._agrees(candidates[0], layout, width, height):
+            candidates = []
+        candidates.append(layout)
+        self.pending[key] = candidates
+        if len(candidates) >= self.min_agreement:
+            self.cache[key] = candidates[0].to_dict()
+            self.stale.discard(key)
+            del self.pending[key]
+            self._save_cache()
+        return layout
+
+    def calibrate(self, screenshot: np.ndarray) -> Layout:
+        """Находит панель рынка и сетку карточек"""
+        return self.calibrate_with_confidence(screenshot)[0]
+
+    def calibrate_with_confidence(self, screenshot: np.ndarray) -> Tuple[Layout, bool]:
+        """Находит панель и сетку; второй элемент — найдено ли всё по линиям, без значений по умолчанию"""
+        gray = cv2.cvtColor(screenshot, cv2.COLOR_BGR2GRAY) if screenshot.ndim == 3 else screenshot
+        height, width = gray.shape[:2]
+        confident = True
+        if self.detect_panel:
+            panel = self._detect_panel(gray)
+            if panel is None:
+                confident = False
+                panel = (int(width * DEFAULT_PANEL['left']), int(height * DEFAULT_PANEL['top']),
+                         int(width * (1 - DEFAULT_PANEL['right'])), int(height * (1 - DEFAULT_PANEL['bottom'])))
+        else:
+            panel = (0, 0, width, height)
+
+        left, top, right, bottom = panel
+        if self.grid:
+            rows, cols = self.grid
+        else:
+            rows, cols = self._detect_grid(gray[top:bottom, left:right])
+            if rows is None or cols is None:
+                confident = False
+            rows = rows or DEFAULT_GRID[0]
+            cols = cols or DEFAULT_GRID[1]
+        return Layout(panel, rows, cols), confident
+
+    @staticmethod
+    def _line_profiles(gray: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Доля пикселей с сильным перепадом яркости в каждом столбце и каждой строке"""
+        dx = np.abs(cv2.Sobel(gray, cv2.CV_32F, 1, 0, ksize=3))
+        dy = np.abs(cv2.Sobel(gray, cv2.CV_32F, 0, 1, ksize=3))
+        threshold = max(float(np.percentile(np.maximum(dx, dy), 90)), 1.0)
+        return (dx > threshold).mean(axis=0), (dy > threshold).mean(axis=1)
+
+    @staticmethod
+    def _find_line(profile: np.ndarray, lo: float, hi: float, min_strength: float = 0.5) -> Optional[int]:
+        """Ищет самую длинную прямую линию в окне [lo, hi) долей профиля (None, если её нет)"""
+        size = len(profile)
+        start, end = int(size * lo), max(int(size * hi), int(size * lo) + 1)
+        window = profile[start:end]
+        if len(window) and window.max() >= min_strength:
+            return start + int(np.argmax(window))
+        return None
+
+    def _detect_panel(self, gray: np.ndarray) -> Optional[Tuple[int, int, int, int]]:
+        """Находит границы панели рынка по длинным линиям около ожидаемых позиций (None, если не нашлись)"""
+        col_profile, row_profile = self._line_profiles(gray)
+        left = self._find_line(col_profile, 0.15, 0.4)
+        right = self._find_line(col_profile, 0.95, 1.0)
+        top = self._find_line(row_profile, 0.1, 0.3)
+        bottom = self._find_line(row_profile, 0.9, 1.0)
+        if None in (left, top, right, bottom):
+            return None
+        if right - left < gray.shape[1] // 4 or bottom - top < gray.shape[0] // 4:
+            return None
+        return left, top, right, bottom
+
+    @staticmethod
+    def _grid_count(profile: np.ndarray, candidates: Tuple[int, ...]) -> Optional[int]:
+        """Выбирает число ячеек, у которого границы попадают в промежутки между карточками.
+
+        Для каждого кандидата берётся средняя плотность границ в окрестности
+        предполагаемых разделителей; из почти равных выбирается наибольшее
+        число (кратные делители тоже попадают в промежутки). None, если
+        промежутков между карточками не видно.
+        """
+        size = len(profile)
+        mean = float(profile.mean())
+        if size == 0 or mean <= 0:
+            return None
+        radius = max(size // 50, 1)
+
+        scores = {}
+        for n in candidates:
+            edges = (np.arange(1, n) * size) // n
+            scores[n] = float(np.mean([profile[max(e - radius, 0):e + radius + 1].min() for e in edges])) / mean
+
+        best = min(scores.values())
+        if best > 0.8:
+            return None
+        return max(n for n, score in scores.items() if score <= best * 1.15 + 0.05)
+
+    def _detect_grid(self, panel: np.ndarray) -> Tuple[Optional[int], Optional[int]]:
+        """Определяет число строк и столбцов сетки карточек (None там, где промежутков не видно)"""
+        grad = cv2.Laplacian(panel, cv2.CV_32F)
+        energy = np.abs(grad)
+        rows = self._grid_count(energy.mean(axis=1), ROW_CANDIDATES)
+        cols = self._grid_count(energy.mean(axis=0), COL_CANDIDATES)
+        return rows, cols
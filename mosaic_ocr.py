@@ -0,0 +1,121 @@
+import numpy as np
+from typing import Dict, Hashable, List, Optional, Tuple
+
+# Один результат EasyOCR: (четыре точки рамки, текст, уверенность)
+OCRResult = Tuple[List[List[float]], str, float]
+
+
+class MosaicOCR:
+    """Распознаёт много маленьких регионов за один проход EasyOCR.
+
+    Регионы раскладываются полками на большие холсты с отступами,
+    детектор и распознавание запускаются один раз на холст, а каждая
+    найденная рамка возвращается к региону, который она пересекает.
+    Размер холста ограничен, так как EasyOCR уменьшает изображения
+    больше canvas_size (2560 по умолчанию), что портит мелкий текст.
+
+    EasyOCR склеивает соседние рамки строки, если промежуток меньше
+    width_ths (0.5) высоты текста, поэтому отступ между регионами не
+    меньше gap_ratio их наибольшей высоты. Если рамка всё же задела
+    несколько регионов, она отбрасывается, а эти регионы распознаются
+    по отдельности.
+    """
+
+    def __init__(self, reader, max_size: int = 2560, spacing: int = 24, gap_ratio: float = 1.0,
+                 background: Optional[int] = None):
+        self.reader = reader
+        self.max_size = max_size
+        self.spacing = spacing
+        self.gap_ratio = gap_ratio
+        self.background = background
+
+    def _gap(self, regions: List[np.ndarray]) -> int:
+        """Отступ между регионами: не меньше spacing и gap_ratio наибольшей высоты региона"""
+        max_height = max(region.shape[0] for region in regions)
+        return max(self.spacing, int(np.ceil(self.gap_ratio * max_height)))
+
+    def _background_value(self, regions: List[np.ndarray]) -> np.ndarray:
+        """Цвет фона — медиана граничных пикселей регионов, чтобы стыки не давали ложных рамок"""
+        if self.background is not None:
+            return np.array(self.background, dtype=np.uint8)
+        borders = [np.concatenate([r[0], r[-1], r[:, 0], r[:, -1]]) for r in regions if r.size]
+        return np.median(np.concatenate(borders), axis=0).astype(np.uint8)
+
+    def pack(self, regions: List[np.ndarray]) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Раскладывает регионы по холстам.
+
+        Возвращает список (холст, размещения), где размещения — массив
+        строк (индекс региона, x, y, ширина, высота).
+        """
+        if not regions:
+            return []
+        spacing = self._gap(regions)
+        background = self._background_value(regions)
+
+        pages = []
+        placements: List[Tuple[int, int, int, int, int]] = []
+        x = y = spacing
+        shelf_height = 0
+        for index, region in enumerate(regions):
+            height, width = region.shape[:2]
+            if x + width + spacing > self.max_size and x > spacing:
+                x, y = spacing, y + shelf_height + spacing
+                shelf_height = 0
+            if y + height + spacing > self.max_size and placements:
+                pages.append(placements)
+                placements = []
+                x = y = spacing
+                shelf_height = 0
+            placements.append((index, x, y, width, height))
+            x += width + spacing
+            shelf_height = max(shelf_height, height)
+        pages.append(placements)
+
+        result = []
+        for page in pages:
+            boxes = np.array(page)
+            canvas_width = int((boxes[:, 1] + boxes[:, 3]).max()) + spacing
+            canvas_height = int((boxes[:, 2] + boxes[:, 4]).max()) + spacing
+            shape = (canvas_height, canvas_width) + regions[0].shape[2:]
+            canvas = np.empty(shape, dtype=regions[0].dtype)
+            canvas[...] = background
+            for index, px, py, width, height in page:
+                canvas[py:py + height, px:px + width] = regions[index]
+            result.append((canvas, boxes))
+        return result
+
+    def read(self, regions: Dict[Hashable, np.ndarray], **readtext_kwargs) -> Dict[Hashable, List[OCRResult]]:
+        """Распознаёт регионы {ключ: изображение} и возвращает {ключ: результаты readtext}.
+
+        Координаты рамок в результатах пересчитаны в систему координат
+        исходного региона.
+        """
+        readtext_kwargs.setdefault('paragraph', False)
+        keys = list(regions)
+        images = [regions[key] for key in keys]
+        recognized: Dict[Hashable, List[OCRResult]] = {key: [] for key in keys}
+        split_regions = set()
+
+        for canvas, boxes in self.pack(images):
+            left, top = boxes[:, 1], boxes[:, 2]
+            right, bottom = left + boxes[:, 3], top + boxes[:, 4]
+            for box, text, confidence in self.reader.readtext(canvas, **readtext_kwargs):
+                points = np.asarray(box, dtype=np.float32)
+                # Регионы, которые пересекает рамка (заход рамки в отступ не считается)
+                x0, y0 = points.min(axis=0)
+                x1, y1 = points.max(axis=0)
+                touched = np.flatnonzero((left < x1) & (x0 < right) & (top < y1) & (y0 < bottom))
+                if len(touched) > 1:
+                    # Текст склеен из нескольких регионов — его нельзя честно разделить
+                    split_regions.update(int(boxes[i, 0]) for i in touched)
+                    continue
+                if not len(touched):
+                    continue
+                index, px, py = boxes[touched[0], :3]
+                local_box = (points - [px, py]).tolist()
+                recognized[keys[index]].append((local_box, text, confidence))
+
+        for index in sorted(split_regions):
+            recognized[keys[index]] = [(np.asarray(box, dtype=np.float32).tolist(), text, confidence)
+                                       for box, text, confidence in self.reader.readtext(images[index], **readtext_kwargs)]
+        return recognized
@@ -0,0 +1,80 @@
+import cv2
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+from layout import FIELD_RATIOS, extract_fields
+
+
+class ScrollOverlapDetector:
+    """Находит строки карточек, уже попавшие в предыдущий скриншот прокрутки.
+
+    Картинка предмета каждой карточки сжимается до маленькой серой
+    миниатюры, а текст (название, количество и цена) сравнивается в
+    полном разрешении: на миниатюре другая цена почти не видна, а при
+    сортировке рынка по предмету соседние скриншоты содержат ту же
+    картинку с другими ценами. Строка считается повтором, только если
+    совпали и картинки, и текст всех её карточек. Ищется самое длинное
+    совпадение конца предыдущего скриншота с началом текущего.
+    Скриншоты должны идти в порядке съёмки.
+    """
+
+    def __init__(self, thumb_size: int = 32, max_difference: float = 6.0, max_text_difference: float = 12.0,
+                 field_ratios: Optional[Dict[str, float]] = None):
+        self.thumb_size = thumb_size
+        self.max_difference = max_difference
+        # Порог средней разницы в самом непохожем блоке текста (блок — квадрат в полстроки)
+        self.max_text_difference = max_text_difference
+        self.field_ratios = field_ratios or FIELD_RATIOS
+        self.previous: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+    def reset(self) -> None:
+        """Забывает предыдущий скриншот (начало новой сессии прокрутки)"""
+        self.previous = None
+
+    @staticmethod
+    def _gray(image: np.ndarray) -> np.ndarray:
+        return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+
+    def row_signatures(self, cards: List[np.ndarray], cols: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Миниатюры картинок формы (строки, столбцы, пиксели) и текст формы (строки, столбцы, высота, ширина)"""
+        size = self.thumb_size
+        thumbs = []
+        texts = []
+        for card in cards:
+            gray = self._gray(card)
+            art_height = gray.shape[0] - int(gray.shape[0] * self.field_ratios['text'])
+            thumbs.append(cv2.resize(gray[:max(art_height, 1)], (size, size), interpolation=cv2.INTER_AREA).ravel())
+            # Название, количество и цена одной высоты — склеиваются в одну полосу
+            texts.append(np.hstack(extract_fields(gray, self.field_ratios)))
+        rows = len(cards) // cols
+        art = np.stack(thumbs).astype(np.float32).reshape(rows, cols, -1)
+        text = np.stack(texts).astype(np.float32)
+        return art, text.reshape((rows, cols) + text.shape[1:])
+
+    def _text_difference(self, previous: np.ndarray, current: np.ndarray) -> np.ndarray:
+        """Средняя разница в самом непохожем блоке текста каждой карточки"""
+        height, width = previous.shape[-2:]
+        block = max(height // 2, 1)
+        height, width = height - height % block, width - width % block
+        difference = np.abs(previous[..., :height, :width] - current[..., :height, :width])
+        blocks = difference.reshape(difference.shape[:-2] + (height // block, block, width // block, block))
+        return blocks.mean(axis=(-3, -1)).max(axis=(-2, -1))
+
+    def first_new_row(self, cards: List[np.ndarray], cols: int) -> int:
+        """Возвращает индекс первой строки, которой не было на предыдущем скриншоте"""
+        current = self.row_signatures(cards, cols)
+        previous, self.previous = self.previous, current
+        if previous is None or any(p.shape[1:] != c.shape[1:] for p, c in zip(previous, current)):
+            return 0
+
+        previous_art, previous_text = previous
+        current_art, current_text = current
+        rows = min(len(previous_art), len(current_art))
+        for overlap in range(rows, 0, -1):
+            # Средняя разница пикселей картинки каждой карточки перекрывающихся строк
+            art_difference = np.abs(previous_art[-overlap:] - current_art[:overlap]).mean(axis=2)
+            if art_difference.max() > self.max_difference:
+                continue
+            text_difference = self._text_difference(previous_text[-overlap:], current_text[:overlap])
+            if text_difference.max() <= self.max_text_difference:
+                return overlap
+        return 0
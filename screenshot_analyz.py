@@ -6,14 +6,24 @@ import json
 import os
 import re
 from typing import List, Dict
+from digit_reader import DigitReader
+from artwork_index import ArtworkIndex
+from layout import FIELD_RATIOS, extract_fields
+from debug_sink import DebugArtifactSink
 
 class ScreenshotAnalyzer:
-    def __init__(self, screenshot_path: str, output_json: str = 'json/price_data.json', skins_file: str = 'skins.txt'):
+    def __init__(self, screenshot_path: str, output_json: str = 'json/price_data.json', skins_file: str = 'skins.txt',
+                 debug_sink: DebugArtifactSink = None):
         self.screenshot_path = screenshot_path
         self.output_json = output_json
         self.output_dir = 'testscreen'
+        # Отладочные регионы пишутся только при включённом sink (по умолчанию выключен)
+        self.debug_sink = debug_sink or DebugArtifactSink(self.output_dir)
         self.skins_file = skins_file
+        self.field_ratios = {**FIELD_RATIOS, 'count_right': 0.45}
         self.reader = Reader(lang_list=["en"], gpu=True, verbose=False, model_storage_directory='./easyocr_models')
+        self.digit_reader = DigitReader()
+        self.artwork_index = ArtworkIndex()
         self._load_names()  # Загружаем имена один раз при инициализации
 
     def _load_names(self) -> None:
@@ -30,47 +40,41 @@ class ScreenshotAnalyzer:
         except Exception:
             self.names = set()
 
-    def setup_directories(self) -> None:
-        """Создает директорию testscreen, если её нет"""
-        os.makedirs(self.output_dir, exist_ok=True)
-
-    def extract_text_regions(self, image: np.ndarray) -> tuple:
+    def extract_text_regions(self, image: np.ndarray, card_id: str = None) -> tuple:
         """Извлекает регионы с текстом из изображения"""
-        hi, wi = image.shape[:2]
-        text_region_height = int(hi * 0.37)
-        count_and_price_r = int(hi * 0.18)
-
-        text_region = image[hi - text_region_height:hi, :]
-        count_and_price = image[hi - count_and_price_r:hi, :]
-
-        hi1 = count_and_price.shape[0]
-        name_region = text_region[hi1 - hi1:hi1, :]
-        count_region = count_and_price[:, :int(wi * 0.45)]
-        price_region = count_and_price[:, int(wi * 0.4):]
+        name_region, count_region, price_region = extract_fields(image, self.field_ratios)
 
-        # Сохранение регионов только для отладки (можно убрать в продакшене)
-        cv2.imwrite(os.path.join(self.output_dir, 'text_region.png'), text_region)
-        cv2.imwrite(os.path.join(self.output_dir, 'name_region.png'), name_region)
-        cv2.imwrite(os.path.join(self.output_dir, 'count_region.png'), count_region)
-        cv2.imwrite(os.path.join(self.output_dir, 'price_region.png'), price_region)
+        # Регионы для отладки отдаются в фоновый sink, если карточка попала в выборку
+        card_id = card_id or os.path.basename(self.screenshot_path)
+        if self.debug_sink.wants(card_id):
+            hi = image.shape[0]
+            self.debug_sink.stage(card_id, 'text_region', image[hi - int(hi * self.field_ratios['text']):hi, :])
+            self.debug_sink.stage(card_id, 'name_region', name_region)
+            self.debug_sink.stage(card_id, 'count_region', count_region)
+            self.debug_sink.stage(card_id, 'price_region', price_region)
 
         return name_region, count_region, price_region
 
     def process_price(self, price_image):
         """Обрабатывает регион с ценой"""
-        price_res = self.reader.readtext(price_image, allowlist='G0123456789.,')
-        price_res.sort(key=lambda x: x[-1], reverse=True)
-        best_text = price_res[0][1] if price_res else "0.0"
+        best_text = self.digit_reader.read_number(price_image, from_end=True)
+        if best_text is None:
+            price_res = self.reader.readtext(price_image, allowlist='G0123456789.,')
+            price_res.sort(key=lambda x: x[-1], reverse=True)
+            best_text = price_res[0][1] if price_res else "0.0"
         match = re.search(r'(\d+\.\d+|\d+)', best_text)
         return float(match.group(1)) if match else 0.0
 
 
     def process_count(self, count_image: np.ndarray) -> int:
         """Обрабатывает регион с количеством"""
-        count_res = self.reader.readtext(count_image, detail=0)
-        if not count_res:
-            return 0
-        match = re.search(r'(\d+)', count_res[0])
+        count_text = self.digit_reader.read_number(count_image)
+        if count_text is None:
+            count_res = self.reader.readtext(count_image, detail=0)
+            if not count_res:
+                return 0
+            count_text = count_res[0]
+        match = re.search(r'(\d+)', count_text)
         return int(match.group(1)) if match else 0
 
     def process_name(self, name_image: np.ndarray) -> str:
@@ -93,19 +97,23 @@ class ScreenshotAnalyzer:
         if image is None:
             return []
 
-        self.setup_directories()
-        name_image, count_image, price_image = self.extract_text_regions(image)
+        card_id = os.path.basename(self.screenshot_path)
+        name_image, count_image, price_image = self.extract_text_regions(image, card_id)
         skins = []
 
         try:
-            skins.append({
-                'name': self.process_name(name_image),
+            name, _ = self.artwork_index.lookup(image)
+            skin = {
+                'name': name or self.process_name(name_image),
                 'price': self.process_price(price_image),
                 'count': self.process_count(count_image)
-            })
+            }
+            skins.append(skin)
         except Exception as e:
+            self.debug_sink.commit(card_id, is_complete=False)
             return str(e)
 
+        self.debug_sink.commit(card_id, is_complete=skin['price'] > 0 and skin['count'] > 0)
         return skins
 
     def save_results(self, skins_list: List[Dict]) -> None:
@@ -122,6 +130,8 @@ def main():
     except Exception as ex:
         print(f"Ошибка: {ex}")
         exit(4)
+    finally:
+        analyzer.debug_sink.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -7,15 +7,27 @@ from sys import stderr
 import ssl
 import os
 import re
+from functools import partial
+from digit_reader import DigitReader
+from artwork_index import ArtworkIndex
+from layout import extract_fields
+from intermediates import iter_intermediates, natural_key
+from shm_transport import SharedCardPipeline
+from mosaic_ocr import MosaicOCR
+from autoscaler import WorkerAutoscaler
 
 ssl._create_default_context = ssl._create_unverified_context
 
+PRICE_ALLOWLIST = 'G0123456789.,'
+
 class ScreenshotAnalyzer:
     def __init__(self, screenshots_dir='./ready_screenshots/', output_json='./json/results.json'):
         self.screenshots_dir = screenshots_dir
         self.output_json = output_json
         self.reader = Reader(lang_list=["en"], gpu=False, verbose=True, model_storage_directory='./easyocr_models')
-        self.image_extensions = ('.png', '.jpg', '.jpeg')
+        self.digit_reader = DigitReader()
+        self.artwork_index = ArtworkIndex()
+        self.mosaic = MosaicOCR(self.reader)
         
     def setup_directories(self):
         """Создает необходимые директории для выходного JSON файла"""
@@ -23,57 +35,66 @@ class ScreenshotAnalyzer:
 
     def extract_text_regions(self, image):
         """Извлекает регионы с текстом из изображения"""
-        hi, wi = image.shape[:2]
-        text_region_height = int(hi * 0.37)
-        text_region = image[hi - text_region_height:hi, 0:wi]
-        count_and_price_r = int(hi * 0.18)
-        count_and_price = image[hi - count_and_price_r:hi, 0:wi]
-
-        hi1, wi1 = count_and_price.shape[:2]
-        height_to_keep = int(hi1 * 1)
-        
-        name_region = text_region[hi1 - height_to_keep:hi1, 0:wi1]
-        count_region = count_and_price[:, 0:int(wi * 0.5)]
-        price_region = count_and_price[:, int(wi * 0.4):wi]
+        return extract_fields(image)
 
-        return name_region, count_region, price_region
+    def parse_price(self, price_res):
+        """Извлекает цену из результатов readtext (берётся самый уверенный)"""
+        price_res = sorted(price_res, key=lambda x: x[-1], reverse=True)
+        best_text = price_res[0][1] if price_res else "0.0"
+        match = re.search(r'(\d+\.\d+|\d+)', best_text)
+        return float(match.group(1)) if match else 0.0
+
+    def parse_count(self, count_res):
+        """Извлекает количество из результатов readtext"""
+        count_text = count_res[0][-2] if count_res else "0"
+        match = re.search(r'(\d+)', count_text)
+        return int(match.group(1)) if match else 0
+
+    def parse_name(self, name_res):
+        """Собирает название из уверенно распознанных фрагментов"""
+        return ' '.join([res[-2] for res in name_res if res[-1] >= 0.4]) if name_res else "Неизвестно"
 
     def process_price(self, price_image):
         """Обрабатывает регион с ценой"""
-        price_res = self.reader.readtext(price_image, allowlist='G0123456789.,')
-        price_res.sort(key=lambda x: x[-1], reverse=True)
-        best_text = price_res[0][1] if price_res else "0.0"
+        best_text = self.digit_reader.read_number(price_image, from_end=True)
+        if best_text is None:
+            return self.parse_price(self.reader.readtext(price_image, allowlist=PRICE_ALLOWLIST))
         match = re.search(r'(\d+\.\d+|\d+)', best_text)
         return float(match.group(1)) if match else 0.0
 
     def process_count(self, count_image):
         """Обрабатывает регион с количеством"""
-        count_res = self.reader.readtext(count_image)
-        count_text = count_res[0][-2] if count_res and count_res[0][-1] >= 0.4 else count_res[0][-2] if count_res else "0"
+        count_text = self.digit_reader.read_number(count_image)
+        if count_text is None:
+            return self.parse_count(self.reader.readtext(count_image))
         match = re.search(r'(\d+)', count_text)
         return int(match.group(1)) if match else 0
 
     def process_name(self, name_image):
         """Обрабатывает регион с названием"""
-        name_res = self.reader.readtext(name_image)
-        name_text = ' '.join([res[-2] for res in name_res if res[-1] >= 0.4]) if name_res else "Неизвестно"
-        return name_text
+        return self.parse_name(self.reader.readtext(name_image))
 
     def process_image(self, filepath):
         """Обрабатывает одно изображение"""
         image = cv2.imread(filepath)
         if image is None:
             return None
+        return self.process_card(image, os.path.basename(filepath))
 
+    def process_card(self, image, filename):
+        """Обрабатывает одну карточку, уже загруженную в память"""
         name_image, count_image, price_image = self.extract_text_regions(image)
         
         try:
             price = self.process_price(price_image)
             count = self.process_count(count_image)
-            name = self.process_name(name_image)
+            # Известные предметы определяются по картинке, OCR названия — только для остальных
+            name, _ = self.artwork_index.lookup(image)
+            if name is None:
+                name = self.process_name(name_image)
 
             return {
-                'filename': os.path.basename(filepath),
+                'filename': filename,
                 'name': name,
                 'price': price,
                 'count': count
@@ -81,7 +102,74 @@ class ScreenshotAnalyzer:
         except Exception as e:
             return None
 
-    def analyze_screenshots(self):
+    def analyze_cards_mosaic(self, cards):
+        """Обрабатывает пачку карточек [(имя, изображение)], распознавая поля мозаикой.
+
+        Поля, которые не удалось прочитать шаблонами глифов и индексом
+        картинок, собираются со всех карточек на общие холсты: цены —
+        с allowlist цифр, количества и названия — без него. Возвращает
+        список той же длины; для карточки с ошибкой — None.
+        """
+        fields = {}
+        price_regions = {}
+        text_regions = {}
+        for card_index, (_, image) in enumerate(cards):
+            try:
+                name_image, count_image, price_image = self.extract_text_regions(image)
+                name, _ = self.artwork_index.lookup(image)
+                price_text = self.digit_reader.read_number(price_image, from_end=True)
+                count_text = self.digit_reader.read_number(count_image)
+            except Exception as e:
+                continue
+            fields[card_index] = {'name': name, 'price': price_text, 'count': count_text}
+
+            if price_text is None:
+                price_regions[card_index] = price_image
+            if count_text is None:
+                text_regions[(card_index, 'count')] = count_image
+            if name is None:
+                text_regions[(card_index, 'name')] = name_image
+
+        prices = self.read_regions(price_regions, allowlist=PRICE_ALLOWLIST)
+        texts = self.read_regions(text_regions)
+
+        skins_list = []
+        for card_index, (filename, _) in enumerate(cards):
+            try:
+                card_fields = fields[card_index]
+                if card_fields['price'] is None:
+                    price = self.parse_price(prices[card_index])
+                else:
+                    price = self.parse_price([(None, card_fields['price'], 1.0)])
+                if card_fields['count'] is None:
+                    count = self.parse_count(texts[(card_index, 'count')])
+                else:
+                    count = self.parse_count([(None, card_fields['count'], 1.0)])
+                name = card_fields['name'] or self.parse_name(texts[(card_index, 'name')])
+                skins_list.append({
+                    'filename': filename,
+                    'name': name,
+                    'price': price,
+                    'count': count
+                })
+            except Exception as e:
+                skins_list.append(None)
+        return skins_list
+
+    def read_regions(self, regions, **readtext_kwargs):
+        """Распознаёт регионы мозаикой; при ошибке — по одному, чтобы она затронула только свой регион"""
+        try:
+            return self.mosaic.read(regions, **readtext_kwargs)
+        except Exception as e:
+            recognized = {}
+            for key, region in regions.items():
+                try:
+                    recognized[key] = self.reader.readtext(region, **readtext_kwargs)
+                except Exception as e:
+                    recognized[key] = []
+            return recognized
+
+    def analyze_screenshots(self, mosaic=False, mosaic_batch=64):
         """Анализирует все скриншоты в директории"""
         if not os.path.exists(self.screenshots_dir):
             return []
@@ -89,10 +177,19 @@ class ScreenshotAnalyzer:
         self.setup_directories()
         skins_list = []
 
-        for filename in os.listdir(self.screenshots_dir):
-            if filename.lower().endswith(self.image_extensions):
-                filepath = os.path.join(self.screenshots_dir, filename)
-                result = self.process_image(filepath)
+        # Читаются и png/jpg, и .npy стопки/пачки сплиттера
+        if mosaic:
+            batch = []
+            for filename, image in iter_intermediates(self.screenshots_dir):
+                batch.append((filename, image))
+                if len(batch) >= mosaic_batch:
+                    skins_list.extend(result for result in self.analyze_cards_mosaic(batch) if result)
+                    batch = []
+            if batch:
+                skins_list.extend(result for result in self.analyze_cards_mosaic(batch) if result)
+        else:
+            for filename, image in iter_intermediates(self.screenshots_dir):
+                result = self.process_card(image, filename)
                 if result:
                     skins_list.append(result)
 
@@ -107,6 +204,55 @@ class ScreenshotAnalyzer:
         except Exception as e:
             return []
 
+def limit_torch_threads(threads):
+    """Ограничивает потоки torch в воркере: иначе каждый воркер EasyOCR занимает все ядра"""
+    if threads:
+        import torch
+        torch.set_num_threads(threads)
+
+def create_card_worker(threads=None):
+    """Создаёт анализатор в процессе-воркере и возвращает его обработчик карточек"""
+    limit_torch_threads(threads)
+    return ScreenshotAnalyzer().process_card
+
+def create_mosaic_worker(threads=None):
+    """Создаёт анализатор в процессе-воркере и возвращает обработчик пачек карточек (мозаика)"""
+    limit_torch_threads(threads)
+    return ScreenshotAnalyzer().analyze_cards_mosaic
+
+def analyze_split_screenshots(splitter, workers=4, output_json='./json/results.json', mosaic=False, rss_budget_mb=None):
+    """Анализирует карточки прямо из сплиттера в нескольких процессах.
+
+    Карточки передаются воркерам через разделяемую память (shm_transport),
+    без записи PNG и без сериализации массивов. При заданном rss_budget_mb
+    работа начинается с одного воркера, а их число и размер пачки
+    подбирает WorkerAutoscaler (workers — верхняя граница). Буфер
+    рассчитан на наибольшие пачки у всех воркеров.
+    """
+    autoscaler = None
+    slots = 64
+    # Ядра делятся между воркерами поровну
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    if rss_budget_mb is not None:
+        autoscaler = WorkerAutoscaler(rss_budget_mb, max_workers=workers, worker_threads=threads)
+        slots = max(slots, autoscaler.max_workers * autoscaler.max_batch_size)
+        workers = 1
+    pipeline = SharedCardPipeline(
+        partial(create_mosaic_worker if mosaic else create_card_worker, threads=threads),
+        workers=workers,
+        slots=slots,
+        batch_size=16 if mosaic else 1,
+        batch_handler=mosaic,
+        autoscaler=autoscaler
+    )
+    results = [(name, result) for name, result in pipeline.run(splitter.iter_card_jobs()) if result]
+    skins_list = [result for _, result in sorted(results, key=lambda item: natural_key(item[0]))]
+
+    os.makedirs(os.path.dirname(output_json), exist_ok=True)
+    with open(output_json, 'w', encoding='utf-8') as json_file:
+        json.dump(skins_list, json_file, ensure_ascii=False, indent=4)
+    return skins_list
+
 def main():
     analyzer = ScreenshotAnalyzer()
     skins_list = analyzer.analyze_screenshots()
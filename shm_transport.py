@@ -0,0 +1,313 @@
+import multiprocessing as mp
+import numpy as np
+import queue
+import time
+from collections import deque
+from multiprocessing import shared_memory
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+class CardRingBuffer:
+    """Кольцевой буфер карточек в разделяемой памяти: воркерам передаются только номера слотов.
+
+    Слоты учитывает только создавший буфер процесс.
+    """
+
+    def __init__(self, slots: int, slot_bytes: int, name: Optional[str] = None):
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=slots * slot_bytes)
+            self.owner = True
+            self.free_slots = deque(range(slots))
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.owner = False
+            self.free_slots = deque()
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def view(self, slot: int, shape: Tuple[int, ...], dtype=np.uint8) -> np.ndarray:
+        """Массив поверх слота (без копирования)"""
+        return np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=slot * self.slot_bytes)
+
+    def acquire(self, shape: Tuple[int, ...], dtype=np.uint8) -> Optional[Tuple[int, np.ndarray]]:
+        """Занимает свободный слот и возвращает его номер и массив для записи (None, если свободных нет)"""
+        nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        if nbytes > self.slot_bytes:
+            raise ValueError(f"Карточка {shape} не помещается в слот размером {self.slot_bytes} байт")
+        if not self.free_slots:
+            return None
+        slot = self.free_slots.popleft()
+        return slot, self.view(slot, shape, dtype)
+
+    def release(self, slot: int) -> None:
+        """Возвращает слот в список свободных"""
+        self.free_slots.append(slot)
+
+    def close(self) -> None:
+        """Отключается от памяти; владелец также удаляет её"""
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def _worker_loop(worker_factory, batch_handler, worker_id, shm_name, slots, slot_bytes, tasks, results):
+    """Цикл воркера: берёт пачку слотов из своей очереди и отправляет результаты с номером пачки"""
+    buffer = CardRingBuffer(slots, slot_bytes, name=shm_name)
+    handler = worker_factory()
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            batch_id, batch = task
+            started = time.perf_counter()
+            items = [(card_name, buffer.view(slot, shape, dtype)) for slot, shape, dtype, card_name in batch]
+            try:
+                if batch_handler:
+                    batch_results = list(zip([name for name, _ in items], handler(items)))
+                else:
+                    batch_results = [(name, handler(image, name)) for name, image in items]
+            except Exception as e:
+                batch_results = [(name, None) for name, _ in items]
+                print(f"Ошибка обработки пачки карточек: {e}")
+            finally:
+                del items
+            results.put((worker_id, batch_id, time.perf_counter() - started, batch_results))
+    finally:
+        buffer.close()
+
+
+class _WorkerHandle:
+    """Процесс-воркер, его очередь заданий и номера выданных ему пачек (по порядку)"""
+
+    def __init__(self, worker_id: int, process, tasks):
+        self.worker_id = worker_id
+        self.process = process
+        self.tasks = tasks
+        self.batches: Deque[int] = deque()
+        self.stopping = False
+
+
+class SharedCardPipeline:
+    """Передаёт карточки воркерам OCR через CardRingBuffer пачками по batch_size.
+
+    worker_factory — функция модуля, возвращающая process_card(image, name)
+    (при batch_handler=True — обработчик списка [(имя, изображение)]).
+    """
+
+    def __init__(self, worker_factory: Callable, workers: int = 2, slots: int = 32, slot_bytes: Optional[int] = None,
+                 batch_size: int = 1, batch_handler: bool = False, autoscaler=None, prefetch: int = 2,
+                 max_restarts: int = 8):
+        self.worker_factory = worker_factory
+        self.workers = workers
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.batch_size = batch_size
+        self.batch_handler = batch_handler
+        self.autoscaler = autoscaler
+        # Сколько пачек может ждать в очереди одного воркера
+        self.prefetch = max(1, prefetch)
+        # Упавший воркер заменяется новым не более max_restarts раз за работу
+        self.max_restarts = max_restarts
+        self.restarts = 0
+        self.context = mp.get_context('spawn')
+        self.results = self.context.Queue()
+        self.buffer: Optional[CardRingBuffer] = None
+        self.handles: List[_WorkerHandle] = []
+        self.next_worker_id = 0
+        self.active_workers = 0
+        self.pending = []
+        self.batches: Dict[int, list] = {}
+        self.ready: Deque[int] = deque()
+        self.next_batch_id = 0
+        self.finished = deque()
+        # Сколько раз производитель ждал свободный слот (сигнал нехватки воркеров для автоскейлера)
+        self.acquire_waits = 0
+
+    @property
+    def in_flight(self) -> int:
+        """Число отправленных и ещё не обработанных пачек"""
+        return len(self.batches)
+
+    @property
+    def waiting_cards(self) -> int:
+        """Карточки, которые ждут воркера: накапливаемая пачка, невыданные пачки и очереди воркеров за текущей пачкой"""
+        queued = list(self.ready) + [batch_id for handle in self.handles for batch_id in list(handle.batches)[1:]]
+        return len(self.pending) + sum(len(self.batches[batch_id]) for batch_id in queued)
+
+    @property
+    def idle_workers(self) -> int:
+        """Число работающих воркеров без выданных пачек"""
+        return sum(1 for handle in self.handles if not handle.stopping and not handle.batches)
+
+    def _start(self, first_shape: Tuple[int, ...], dtype) -> None:
+        """Создаёт буфер по размеру первой карточки и запускает воркеры"""
+        if self.slot_bytes is None:
+            self.slot_bytes = int(np.prod(first_shape)) * np.dtype(dtype).itemsize
+        self.buffer = CardRingBuffer(self.slots, self.slot_bytes)
+        for _ in range(self.workers):
+            self.start_worker()
+        if self.autoscaler is not None:
+            self.autoscaler.attach(self)
+
+    def start_worker(self) -> None:
+        """Запускает ещё один процесс-воркер"""
+        tasks = self.context.Queue()
+        process = self.context.Process(
+            target=_worker_loop,
+            args=(self.worker_factory, self.batch_handler, self.next_worker_id, self.buffer.name, self.slots,
+                  self.slot_bytes, tasks, self.results),
+            daemon=True
+        )
+        process.start()
+        self.handles.append(_WorkerHandle(self.next_worker_id, process, tasks))
+        self.next_worker_id += 1
+        self.active_workers += 1
+
+    def stop_worker(self) -> None:
+        """Просит наименее загруженный воркер завершиться после выданных ему пачек"""
+        running = [handle for handle in self.handles if not handle.stopping]
+        if len(running) > 1:
+            handle = min(running, key=lambda h: len(h.batches))
+            handle.stopping = True
+            handle.tasks.put(None)
+            self.active_workers -= 1
+
+    def worker_pids(self) -> list:
+        """PID живых процессов-воркеров"""
+        return [handle.process.pid for handle in self.handles if handle.process.is_alive()]
+
+    def _release_batch(self, batch_id: int) -> list:
+        """Убирает пачку из учёта и освобождает её слоты"""
+        batch = self.batches.pop(batch_id)
+        for slot, _, _, _ in batch:
+            self.buffer.release(slot)
+        return batch
+
+    def _collect(self, timeout: float = 0) -> None:
+        """Забирает готовые результаты воркеров"""
+        while True:
+            try:
+                worker_id, batch_id, duration, batch_results = self.results.get(timeout=timeout)
+            except queue.Empty:
+                break
+            timeout = 0
+            for handle in self.handles:
+                if handle.worker_id == worker_id and batch_id in handle.batches:
+                    handle.batches.remove(batch_id)
+            # Результат пачки, уже списанной вместе с упавшим воркером, не учитывается
+            if batch_id not in self.batches:
+                continue
+            self._release_batch(batch_id)
+            self.finished.extend(batch_results)
+            if self.autoscaler is not None:
+                self.autoscaler.record_batch(len(batch_results), duration)
+
+    def _reap(self) -> None:
+        """Убирает завершившиеся воркеры и восстанавливает пачки упавших"""
+        dead = [handle for handle in self.handles if not handle.process.is_alive()]
+        if any(handle.batches for handle in dead):
+            # Результаты, отправленные воркером до падения, ещё могут лежать в очереди:
+            # забираем их, чтобы первой невыполненной осталась действительно упавшая пачка
+            self._collect(timeout=0.2)
+        for handle in dead:
+            self.handles.remove(handle)
+            if not handle.stopping:
+                self.active_workers -= 1
+            crashed = handle.process.exitcode != 0 or handle.batches
+            if handle.batches:
+                # Первая выданная пачка обрабатывалась в момент падения: повтор мог бы уронить и другой воркер
+                failed = handle.batches.popleft()
+                print(f"Воркер завершился с кодом {handle.process.exitcode}, "
+                      f"карточки пачки не обработаны: {len(self.batches[failed])}")
+                self.finished.extend((card_name, None) for _, _, _, card_name in self._release_batch(failed))
+                self.ready.extendleft(reversed(handle.batches))
+            handle.tasks.close()
+            if crashed and not handle.stopping and self.restarts < self.max_restarts:
+                self.restarts += 1
+                self.start_worker()
+
+    def _dispatch(self) -> None:
+        """Выдаёт ожидающие пачки воркерам, у которых очередь не заполнена"""
+        # У каждого воркера своя очередь: главный процесс знает, какие пачки у кого,
+        # и после падения воркера отдаёт его невыполненные пачки другим
+        while self.ready:
+            running = [handle for handle in self.handles if not handle.stopping and len(handle.batches) < self.prefetch]
+            if not running:
+                break
+            handle = min(running, key=lambda h: len(h.batches))
+            batch_id = self.ready.popleft()
+            handle.batches.append(batch_id)
+            handle.tasks.put((batch_id, self.batches[batch_id]))
+
+    def _poll(self, timeout: float = 0) -> None:
+        """Забирает готовые результаты, следит за воркерами и даёт автоскейлеру оценить нагрузку"""
+        self._collect(timeout)
+        self._reap()
+        self._dispatch()
+        if self.batches and not self.handles:
+            raise RuntimeError("Все воркеры завершились, не обработав карточки")
+        if self.autoscaler is not None:
+            self.autoscaler.tick()
+
+    def _flush(self) -> None:
+        """Ставит накопленную пачку в очередь на выдачу воркерам"""
+        if self.pending:
+            self.batches[self.next_batch_id] = self.pending
+            self.ready.append(self.next_batch_id)
+            self.next_batch_id += 1
+            self.pending = []
+            self._dispatch()
+
+    def submit(self, card_name: str, shape: Tuple[int, ...], fill: Callable[[np.ndarray], None], dtype=np.uint8) -> None:
+        """Занимает слот, заполняет его функцией fill и добавляет карточку в пачку"""
+        if self.buffer is None:
+            self._start(shape, dtype)
+        while True:
+            acquired = self.buffer.acquire(shape, dtype)
+            if acquired is not None:
+                break
+            # Все слоты заняты: отправляем неполную пачку, чтобы не ждать самих себя
+            self.acquire_waits += 1
+            self._flush()
+            self._poll(timeout=0.5)
+        slot, view = acquired
+        fill(view)
+        self.pending.append((slot, tuple(shape), np.dtype(dtype).str, card_name))
+        if len(self.pending) >= self.batch_size:
+            self._flush()
+
+    def run(self, jobs: Iterable[Tuple[str, Tuple[int, ...], Callable[[np.ndarray], None]]]) -> Iterator[Tuple[str, object]]:
+        """Обрабатывает задания (имя, форма, fill) и выдаёт результаты (имя, результат) по мере готовности"""
+        try:
+            for card_name, shape, fill in jobs:
+                self.submit(card_name, shape, fill)
+                self._poll()
+                while self.finished:
+                    yield self.finished.popleft()
+
+            self._flush()
+            while self.batches or self.finished:
+                if not self.finished:
+                    self._poll(timeout=0.5)
+                while self.finished:
+                    yield self.finished.popleft()
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        """Останавливает воркеры и освобождает разделяемую память"""
+        for handle in self.handles:
+            if handle.process.is_alive():
+                handle.tasks.put(None)
+        for handle in self.handles:
+            handle.process.join()
+        self.handles = []
+        self.active_workers = 0
+        if self.buffer is not None:
+            self.buffer.close()
+            self.buffer = None
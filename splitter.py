@@ -1,66 +1,77 @@
 import os
-from PIL import Image
+import cv2
+from layout import LayoutCalibrator
+from intermediates import IntermediateWriter, iter_intermediates
+from overlap import ScrollOverlapDetector
 
 class ImageSplitter:
-    def __init__(self, input_folder='processed_screenshots', output_folder='ready_screenshots'):
+    def __init__(self, input_folder='processed_screenshots', output_folder='ready_screenshots', grid=None,
+                 detect_panel=False, layout_cache='json/layout_cache.json', output_format='png', png_compression=1,
+                 skip_overlap=False, recalibrate=False):
         self.input_folder = input_folder
         self.output_folder = output_folder
         self.index = 0
+        # grid=(строки, столбцы) фиксирует сетку, иначе она определяется калибровкой;
+        # recalibrate=True заменяет сохранённую разметку
+        self.calibrator = LayoutCalibrator(cache_file=layout_cache, detect_panel=detect_panel, grid=grid,
+                                           recalibrate=recalibrate)
+        # Формат промежуточных файлов: png, npy или batch (см. intermediates.py)
+        self.writer = IntermediateWriter(output_folder, output_format, png_compression, prefix='card_')
+        # При прокрутке рынка строки, уже бывшие на предыдущем скриншоте, пропускаются
+        self.overlap_detector = ScrollOverlapDetector() if skip_overlap else None
         
     def setup_output_folder(self):
         """Создает выходную папку, если она не существует"""
         os.makedirs(self.output_folder, exist_ok=True)
     
-    def is_valid_image(self, filename):
-        """Проверяет, является ли файл изображением с допустимым расширением"""
-        valid_extensions = ('.png', '.jpg', '.jpeg')
-        return filename.lower().endswith(valid_extensions)
+    def split_screenshot(self, screenshot):
+        """Возвращает карточки скриншота как срезы массива (без копирования)"""
+        layout = self.calibrator.get_layout(screenshot)
+        cards = layout.cards(screenshot)
+        if self.overlap_detector is None:
+            return cards
+        first_row = self.overlap_detector.first_new_row(cards, layout.cols)
+        return cards[first_row * layout.cols:]
+    
+    def process_screenshot(self, screenshot):
+        """Нарезает один скриншот и сохраняет его карточки"""
+        cards = [self._resize_card(card) for card in self.split_screenshot(screenshot)]
+        if not cards:
+            return
+        self.writer.write(cards)
+        self.index += len(cards)
     
     def process_image(self, image_path):
         """Обрабатывает одно изображение"""
-        screenshot = Image.open(image_path)
-        width, height = screenshot.size
-        
-        # Вычисляем размеры карточки
-        card_width = width // 4
-        card_height = height // 2
-        
-        # Обрабатываем все карточки в изображении
-        for row in range(2):
-            for col in range(4):
-                card = self._crop_card(screenshot, card_width, card_height, row, col)
-                resized_card = self._resize_card(card, card_width, card_height)
-                self._save_card(resized_card)
-                self.index += 1
+        screenshot = cv2.imread(image_path)
+        if screenshot is not None:
+            self.process_screenshot(screenshot)
     
-    def _crop_card(self, image, card_width, card_height, row, col):
-        """Вырезает одну карточку из изображения"""
-        left = col * card_width
-        upper = row * card_height
-        right = left + card_width
-        lower = upper + card_height
-        return image.crop((left, upper, right, lower))
+    def _resize_card(self, card, out=None):
+        """Увеличивает размер карточки в 2 раза (при out — сразу в переданный массив)"""
+        if out is not None:
+            return cv2.resize(card, (out.shape[1], out.shape[0]), dst=out, interpolation=cv2.INTER_LANCZOS4)
+        return cv2.resize(card, None, fx=2, fy=2, interpolation=cv2.INTER_LANCZOS4)
     
-    def _resize_card(self, card, card_width, card_height):
-        """Увеличивает размер карточки в 2 раза"""
-        new_width = int(card_width * 2)
-        new_height = int(card_height * 2)
-        return card.resize((new_width, new_height), Image.LANCZOS)
-    
-    def _save_card(self, card):
-        """Сохраняет карточку в выходную папку"""
-        output_filename = f'card_{self.index}.png'
-        output_path = os.path.join(self.output_folder, output_filename)
-        card.save(output_path, format="png", quality=100)
+    def iter_card_jobs(self):
+        """Перебирает карточки входной папки как задания (имя, форма, fill) для SharedCardPipeline.
+
+        Карточка не сохраняется на диск: fill увеличивает её сразу в слот
+        разделяемой памяти.
+        """
+        for _, screenshot in iter_intermediates(self.input_folder):
+            for card in self.split_screenshot(screenshot):
+                shape = (card.shape[0] * 2, card.shape[1] * 2) + card.shape[2:]
+                yield f'card_{self.index}', shape, lambda out, card=card: self._resize_card(card, out)
+                self.index += 1
     
     def split_all_images(self):
-        """Обрабатывает все изображения в входной папке"""
+        """Обрабатывает все изображения в входной папке (png/jpg и .npy предыдущего этапа)"""
         self.setup_output_folder()
         
-        for filename in os.listdir(self.input_folder):
-            if self.is_valid_image(filename):
-                image_path = os.path.join(self.input_folder, filename)
-                self.process_image(image_path)
+        for _, screenshot in iter_intermediates(self.input_folder):
+            self.process_screenshot(screenshot)
+        self.writer.close()
 
 def main():
     splitter = ImageSplitter()
@@ -68,4 +79,3 @@ def main():
 
 if __name__ == "__main__":
     main()
-
@@ -2,6 +2,8 @@ import cv2
 import numpy as np
 import os
 import json
+from intermediates import iter_intermediates
+from card_parser import CardFieldParser
 
 try:
     import easyocr
@@ -18,6 +20,7 @@ class CardDetector:
         self.incomplete_json_file = incomplete_json_file
         self.complete_card_data = []
         self.incomplete_card_data = []
+        self.field_parser = CardFieldParser(stattrack_prefix="ST ")
         self.setup_output_files()
 
     def setup_output_files(self):
@@ -35,11 +38,18 @@ class CardDetector:
         """Проверяет, является ли файл изображением."""
         return filename.lower().endswith(('.png', '.jpg', '.jpeg'))
 
+    def recognize_card_results(self, card):
+        """Возвращает полные результаты EasyOCR (рамка, текст, уверенность) или None без OCR."""
+        if OCR_ENABLED:
+            return reader.readtext(card)
+        return None
+
     def recognize_card_content(self, card):
         """Распознаёт текст на карточке с помощью EasyOCR."""
-        if OCR_ENABLED:
-            return "\n".join(res[1] for res in reader.readtext(card))
-        return "OCR не доступен"
+        results = self.recognize_card_results(card)
+        if results is None:
+            return "OCR не доступен"
+        return "\n".join(res[1] for res in results)
 
     def parse_card_text(self, text):
         """Извлекает данные (Name, Count(WT), Price) из текста."""
@@ -113,11 +123,18 @@ class CardDetector:
             print(f"Ошибка загрузки изображения: {image_path}")
             return
 
-        image_name = os.path.basename(image_path)
-        text = self.recognize_card_content(image)
-        print(f"Card text: {text}")
-        
-        card_data, is_complete = self.parse_card_text(text)
+        self.process_card(image, os.path.basename(image_path))
+
+    def process_card(self, image, image_name):
+        """Распознаёт уже загруженную карточку и добавляет данные в JSON."""
+        results = self.recognize_card_results(image)
+        if results is None:
+            card_data, is_complete = self.parse_card_text("OCR не доступен")
+        else:
+            text = "\n".join(res[1] for res in results)
+            print(f"Card text: {text}")
+            # Поля разбираются правилами по тексту строк, положение рамок — только для неоднозначных карточек
+            card_data, is_complete = self.field_parser.parse(results, image.shape)
         card_data["image_name"] = image_name
         print(f"Parsed data: {card_data}")
 
@@ -132,11 +149,9 @@ class CardDetector:
 
     def process_all_images(self):
         """Обрабатывает все изображения в папке."""
-        for filename in os.listdir(self.input_folder):
-            if self.is_valid_image(filename):
-                image_path = os.path.join(self.input_folder, filename)
-                print(f"Обработка изображения: {image_path}")
-                self.process_image(image_path)
+        for image_name, image in iter_intermediates(self.input_folder):
+            print(f"Обработка изображения: {os.path.join(self.input_folder, image_name)}")
+            self.process_card(image, image_name)
 
 def main():
     detector = CardDetector(input_folder='ready_screenshots')
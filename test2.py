@@ -3,15 +3,28 @@ import numpy as np
 import os
 import json
 import time
+from intermediates import count_intermediates, iter_intermediates
+from debug_sink import DebugArtifactSink
+from card_parser import CardFieldParser
+from functools import partial
 
 try:
     import easyocr
     OCR_ENABLED = True
-    reader = easyocr.Reader(['en'], gpu=False)  # Отключаем GPU, так как нет CUDA
 except ModuleNotFoundError:
     OCR_ENABLED = False
     print("EasyOCR не установлен. Функция OCR отключена.")
 
+reader = None
+
+
+def get_reader():
+    """Создаёт EasyOCR при первом распознавании: импорт модуля не загружает модель"""
+    global reader
+    if reader is None:
+        reader = easyocr.Reader(['en'], gpu=False)  # Отключаем GPU, так как нет CUDA
+    return reader
+
 # Функция для вычисления расстояния Левенштейна
 def levenshtein_distance(s1, s2):
     if len(s1) < len(s2):
@@ -41,8 +54,104 @@ def find_closest_name(name, correct_names):
         return name
     return closest_name
 
+# Построчный разбор текста карточки (без положения рамок)
+def parse_card_text(text, is_stattrack=False, correct_names=()):
+    lines = text.split("\n")
+    card_data = {"Name": "", "Count(WT)": 0, "Price": 0.0}
+    is_complete = True
+
+    if not lines or "OCR не доступен" in text:
+        card_data["error"] = "OCR failed"
+        return card_data, False
+
+    try:
+        # Обработка Name
+        name = ""
+        start_idx = 0
+        first_line = lines[0].strip() if lines else ""
+        # Если обнаружен StatTrack через изображение или текст "ST", "R", "U"
+        if is_stattrack or first_line.upper() in ["ST", "R", "U"]:
+            start_idx = 1  # Пропускаем первую строку
+            name = lines[1].strip() if len(lines) > 1 else ""
+            if name:
+                name = f"StatTrack {name}"  # Добавляем префикс StatTrack
+        # Если первая строка из 1-2 букв и не "ST", "R", "U", пропускаем её
+        elif len(first_line) <= 2 and first_line.upper() not in ["ST", "R", "U"]:
+            start_idx = 1
+            name = lines[1].strip() if len(lines) > 1 else ""
+        else:
+            # В остальных случаях берём первую строку как имя
+            name = first_line
+
+        # Если имя всё ещё пустое, ищем следующую непустую строку
+        if not name:
+            for line in lines[start_idx:]:
+                line = line.strip()
+                if line and not any(wt_marker in line.lower() for wt_marker in ["wt", "wt:", "wt.", "wt;"]):
+                    name = line
+                    break
+
+        # Корректируем имя через расстояние Левенштейна
+        if name:
+            name = find_closest_name(name, correct_names)
+
+        if not name:
+            is_complete = False
+            card_data["error"] = "Name is empty"
+        card_data["Name"] = name
+
+        # Поиск Count(WT)
+        count, wt_idx = 0, -1
+        for i in range(start_idx, len(lines)):
+            line = lines[i].strip()
+            if any(wt_marker in line.lower() for wt_marker in ["wt", "wt:", "wt.", "wt;"]):
+                count_str = line.lower().split("wt")[0].strip()
+                count = int(count_str) if count_str.isdigit() else 0
+                wt_idx = i
+                break
+            if line.isdigit():
+                count = int(line)
+                if i + 1 < len(lines) and any(wt_marker in lines[i + 1].lower() for wt_marker in ["wt", "wt:", "wt.", "wt;"]):
+                    wt_idx = i + 1
+                    break
+
+        if wt_idx == -1:
+            is_complete = False
+            card_data["error"] = "Count(WT) or wt marker not found"
+        if count <= 0:
+            is_complete = False
+            card_data["error"] = "Invalid Count(WT)"
+        card_data["Count(WT)"] = count
+
+        # Поиск Price
+        price_idx = wt_idx + 1 if wt_idx != -1 else 0
+        price_line = lines[price_idx].strip() if len(lines) > price_idx else ""
+        if price_line.startswith("G"):
+            # Заменяем "O" на "0" для коррекции OCR-ошибок
+            price_str = price_line.replace("G", "").replace("O", "0").replace("s", "5").strip()
+            if price_str.replace(".", "").replace("-", "").isdigit():
+                price = float(price_str)
+            else:
+                price = 0.0
+        else:
+            price = float(price_line) if price_line.replace(".", "").replace("-", "").isdigit() else 0.0
+
+        if price <= 0:
+            is_complete = False
+            card_data["error"] = "Invalid Price"
+        card_data["Price"] = price
+
+    except (IndexError, ValueError) as e:
+        print(f"Ошибка при разборе текста карточки: {e}")
+        print(f"Текст карточки: {text}")
+        card_data["error"] = f"Parsing error: {str(e)}"
+        is_complete = False
+
+    return card_data, is_complete
+
 class CardDetector:
-    def __init__(self, input_folder='simple', complete_json_file='all_card_data.json', incomplete_json_file='incomplete_card_data.json', correct_names_file='correct_names.txt'):
+    def __init__(self, input_folder='simple', complete_json_file='all_card_data.json', incomplete_json_file='incomplete_card_data.json', correct_names_file='correct_names.txt',
+                 debug_sink=None, load_existing=True):
         self.input_folder = input_folder
         self.complete_json_file = complete_json_file
         self.incomplete_json_file = incomplete_json_file
@@ -50,8 +159,14 @@ class CardDetector:
         self.complete_card_data = []
         self.incomplete_card_data = []
         self.correct_names = self.load_correct_names()
-        self.setup_output_files()
+        # Без load_existing уже сохранённые результаты не читаются (например, для записи OCR в бенчмарке)
+        if load_existing:
+            self.setup_output_files()
         self.is_stattrack = False  # Флаг для StatTrack
+        self.field_parser = CardFieldParser(name_corrector=partial(find_closest_name, correct_names=self.correct_names))
+        # Отладочные изображения (по умолчанию выключены), например только неполные карточки:
+        # DebugArtifactSink('testscreen', enabled=True, only_incomplete=True)
+        self.debug_sink = debug_sink or DebugArtifactSink('testscreen')
 
     def load_correct_names(self):
         correct_names = []
@@ -98,10 +213,11 @@ class CardDetector:
     #             return True
     #     return False
 
-    def detect_stattrack(self, image):
+    def detect_stattrack(self, image, card_id=None):
         """Обнаруживает оранжево-жёлтый прямоугольник как индикатор StatTrack и визуализирует результат."""
-        # Создаём копию изображения для визуализации
-        result_image = image.copy()
+        # Копия для визуализации нужна, только если карточка попала в отладочную выборку
+        visualize = card_id is not None and self.debug_sink.wants(card_id)
+        result_image = image.copy() if visualize else None
         # Преобразуем в HSV для сегментации по цвету
         hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
         # Уточнённый диапазон оранжево-жёлтого цвета
@@ -119,118 +235,34 @@ class CardDetector:
             if (x < image.shape[1] // 3 and y > image.shape[0] // 2 and
                 area > 100 and area < 5000):
                 # Рисуем зелёный прямоугольник вокруг найденной области
-                cv2.rectangle(result_image, (x, y), (x + w, y + h), (0, 255, 0), 2)
+                if visualize:
+                    cv2.rectangle(result_image, (x, y), (x + w, y + h), (0, 255, 0), 2)
                 is_detected = True
 
-        # Сохраняем изображение с визуализацией
-        output_path = os.path.join(self.input_folder, f"stattrack_detection_result_.png")
-        cv2.imwrite(output_path, result_image)
-        print(f"Сохранено изображение с визуализацией: {output_path}")
+        # Изображение с визуализацией записывается в фоне (debug_sink)
+        if visualize:
+            self.debug_sink.stage(card_id, 'stattrack', result_image)
 
         return is_detected
 
-    def recognize_card_content(self, image):
+    def recognize_card_results(self, image, card_id=None):
+        """Возвращает полные результаты EasyOCR (рамка, текст, уверенность) или None без OCR."""
         if OCR_ENABLED:
             # Проверяем наличие StatTrack через оранжево-жёлтый прямоугольник
-            self.is_stattrack = self.detect_stattrack(image)
+            self.is_stattrack = self.detect_stattrack(image, card_id)
             if self.is_stattrack:
                 print("Обнаружен StatTrack на изображении (оранжево-жёлтый прямоугольник).")
-            return "\n".join(res[1] for res in reader.readtext(image))
-        return "OCR не доступен"
-
-    def parse_card_text(self, text):
-        lines = text.split("\n")
-        card_data = {"Name": "", "Count(WT)": 0, "Price": 0.0}
-        is_complete = True
-
-        if not lines or "OCR не доступен" in text:
-            card_data["error"] = "OCR failed"
-            return card_data, False
-
-        try:
-            # Обработка Name
-            name = ""
-            start_idx = 0
-            first_line = lines[0].strip() if lines else ""
-            # Если обнаружен StatTrack через изображение или текст "ST", "R", "U"
-            if self.is_stattrack or first_line.upper() in ["ST", "R", "U"]:
-                start_idx = 1  # Пропускаем первую строку
-                name = lines[1].strip() if len(lines) > 1 else ""
-                if name:
-                    name = f"StatTrack {name}"  # Добавляем префикс StatTrack
-            # Если первая строка из 1-2 букв и не "ST", "R", "U", пропускаем её
-            elif len(first_line) <= 2 and first_line.upper() not in ["ST", "R", "U"]:
-                start_idx = 1
-                name = lines[1].strip() if len(lines) > 1 else ""
-            else:
-                # В остальных случаях берём первую строку как имя
-                name = first_line
-
-            # Если имя всё ещё пустое, ищем следующую непустую строку
-            if not name:
-                for line in lines[start_idx:]:
-                    line = line.strip()
-                    if line and not any(wt_marker in line.lower() for wt_marker in ["wt", "wt:", "wt.", "wt;"]):
-                        name = line
-                        break
-
-            # Корректируем имя через расстояние Левенштейна
-            if name:
-                name = find_closest_name(name, self.correct_names)
-
-            if not name:
-                is_complete = False
-                card_data["error"] = "Name is empty"
-            card_data["Name"] = name
-
-            # Поиск Count(WT)
-            count, wt_idx = 0, -1
-            for i in range(start_idx, len(lines)):
-                line = lines[i].strip()
-                if any(wt_marker in line.lower() for wt_marker in ["wt", "wt:", "wt.", "wt;"]):
-                    count_str = line.lower().split("wt")[0].strip()
-                    count = int(count_str) if count_str.isdigit() else 0
-                    wt_idx = i
-                    break
-                if line.isdigit():
-                    count = int(line)
-                    if i + 1 < len(lines) and any(wt_marker in lines[i + 1].lower() for wt_marker in ["wt", "wt:", "wt.", "wt;"]):
-                        wt_idx = i + 1
-                        break
-
-            if wt_idx == -1:
-                is_complete = False
-                card_data["error"] = "Count(WT) or wt marker not found"
-            if count <= 0:
-                is_complete = False
-                card_data["error"] = "Invalid Count(WT)"
-            card_data["Count(WT)"] = count
-
-            # Поиск Price
-            price_idx = wt_idx + 1 if wt_idx != -1 else 0
-            price_line = lines[price_idx].strip() if len(lines) > price_idx else ""
-            if price_line.startswith("G"):
-                # Заменяем "O" на "0" для коррекции OCR-ошибок
-                price_str = price_line.replace("G", "").replace("O", "0").replace("s", "5").strip()
-                if price_str.replace(".", "").replace("-", "").isdigit():
-                    price = float(price_str)
-                else:
-                    price = 0.0
-            else:
-                price = float(price_line) if price_line.replace(".", "").replace("-", "").isdigit() else 0.0
-
-            if price <= 0:
-                is_complete = False
-                card_data["error"] = "Invalid Price"
-            card_data["Price"] = price
+            return get_reader().readtext(image)
+        return None
 
-        except (IndexError, ValueError) as e:
-            print(f"Ошибка при разборе текста карточки: {e}")
-            print(f"Текст карточки: {text}")
-            card_data["error"] = f"Parsing error: {str(e)}"
-            is_complete = False
+    def recognize_card_content(self, image, card_id=None):
+        results = self.recognize_card_results(image, card_id)
+        if results is None:
+            return "OCR не доступен"
+        return "\n".join(res[1] for res in results)
 
-        return card_data, is_complete
+    def parse_card_text(self, text):
+        return parse_card_text(text, self.is_stattrack, self.correct_names)
 
     def process_single_image(self, image_path):
         image = cv2.imread(image_path)
@@ -238,31 +270,33 @@ class CardDetector:
             print(f"Ошибка загрузки изображения: {image_path}")
             return None, None
 
-        image_name = os.path.basename(image_path)
-        text = self.recognize_card_content(image)
-        print(text)
-        card_data, is_complete = self.parse_card_text(text)
+        return self.process_card(image, os.path.basename(image_path))
+
+    def process_card(self, image, image_name):
+        results = self.recognize_card_results(image, image_name)
+        if results is None:
+            card_data, is_complete = self.parse_card_text("OCR не доступен")
+        else:
+            print("\n".join(res[1] for res in results))
+            # Поля разбираются правилами по тексту строк, положение рамок — только для неоднозначных карточек
+            card_data, is_complete = self.field_parser.parse(results, image.shape, self.is_stattrack)
         card_data["image_name"] = image_name
+        self.debug_sink.commit(image_name, is_complete)
         return card_data, is_complete
 
     def process_all_images(self):
-        image_paths = [
-            os.path.join(self.input_folder, filename)
-            for filename in os.listdir(self.input_folder)
-            if self.is_valid_image(filename)
-        ]
+        total_images = count_intermediates(self.input_folder)
 
-        if not image_paths:
+        if not total_images:
             print("Не найдено изображений для обработки.")
             return
 
-        total_images = len(image_paths)
         print(f"Запуск обработки {total_images} изображений...")
 
         start_time = time.time()
-        for idx, image_path in enumerate(image_paths, 1):
-            print(f"Обработка изображения {idx}/{total_images}: {image_path}")
-            result = self.process_single_image(image_path)
+        for idx, (image_name, image) in enumerate(iter_intermediates(self.input_folder), 1):
+            print(f"Обработка изображения {idx}/{total_images}: {image_name}")
+            result = self.process_card(image, image_name)
             if result[0]:  # Если данные не None
                 card_data, is_complete = result
                 target_list = self.complete_card_data if is_complete else self.incomplete_card_data
@@ -277,6 +311,7 @@ class CardDetector:
                 elapsed_time = time.time() - start_time
                 print(f"Обработано {idx}/{total_images} изображений за {elapsed_time:.2f} секунд.")
 
+        self.debug_sink.close()
         elapsed_time = time.time() - start_time
         print(f"Обработка завершена за {elapsed_time:.2f} секунд.")
         print(f"Обработано {total_images} изображений.")